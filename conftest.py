@@ -0,0 +1,65 @@
+import pytest
+from unittest.mock import patch
+from _pytest.monkeypatch import MonkeyPatch
+
+
+# Seconds a unit test call may take before the run is failed, catching e.g. real clients/SDKs being hit by mistake
+UNIT_TEST_DURATION_BUDGET = 0.5
+
+# Node ids and durations of the tests over the budget
+slow_tests = list()
+
+
+@pytest.fixture(scope="session")
+def monkeypatch_session():
+    """Session scoped version of pytest's monkeypatch fixture, undoing its changes at the end of the run."""
+    mp = MonkeyPatch()
+    yield mp
+    mp.undo()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def setup_company_env(monkeypatch_session):
+    """Setup test environment variables once per run, restoring the previous values at its end."""
+    monkeypatch_session.setenv("COMPANY_NAME", "Test Company Inc")
+    monkeypatch_session.setenv("COMPANY_FORMATTED_CNPJ", "12.345.678/0001-90")
+
+
+@pytest.fixture(scope="session")
+def patched_ragflow():
+    """
+    Patch the RAGFlow client and PDFParser classes of ragflow_handler once for the whole run, yielding their mocks.
+    Test modules opt in with 'pytestmark = pytest.mark.usefixtures("patched_ragflow")', so the other modules don't import ragflow_handler.
+    """
+    with patch('ragflow_handler.RAGFlow', autospec=True) as mock_ragflow_class, \
+         patch('ragflow_handler.PDFParser', autospec=True) as mock_pdf_parser:
+        
+        yield mock_ragflow_class, mock_pdf_parser
+
+
+def pytest_runtest_logreport(report):
+    """Collect the tests whose call phase exceeded UNIT_TEST_DURATION_BUDGET."""
+    if report.when == "call" and report.duration > UNIT_TEST_DURATION_BUDGET:
+        slow_tests.append((report.nodeid, report.duration))
+
+
+def pytest_terminal_summary(terminalreporter):
+    """Report the tests over the duration budget."""
+    if slow_tests:
+        terminalreporter.section("tests over the duration budget", red=True)
+        for nodeid, duration in slow_tests:
+            terminalreporter.write_line(f"{nodeid}: {duration:.2f}s (budget {UNIT_TEST_DURATION_BUDGET}s)")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """Fail the run when any test exceeded the duration budget."""
+    if slow_tests and exitstatus == pytest.ExitCode.OK:
+        session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+
+def pytest_collection_modifyitems(config, items):
+    """
+    Keep the tests of each file contiguous (stable sort, so the order inside a file is kept),
+    so module scoped fixtures such as the shared RagflowHandler are never torn down and rebuilt mid run.
+    """
+    items.sort(key=lambda item: str(item.path))
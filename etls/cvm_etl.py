@@ -524,6 +524,8 @@ class CVMETL:
 
             dfs_map[agg_type] = curr_agg_quarterly_df
 
+        cache_entries = list()
+
         for curr_agg_type,curr_df in dfs_map.items():
 
             self.config.logger.info(f"Saving the final gold/serving '{fmts.GoldServingTableNames.FINANCIALS_QUARTERLY}' for aggregation '{curr_agg_type.value}'...")
@@ -554,11 +556,14 @@ class CVMETL:
                                                             agg_type=curr_agg_type
                                                             )
             
-            self.config.redis_handler.save_to_cache(fmts.GoldServingTableNames.FINANCIALS_QUARTERLY,
+            cache_entries.append((fmts.GoldServingTableNames.FINANCIALS_QUARTERLY,
                                 curr_df.to_dict(orient="records"),
                                 datetime.today(),
                                 self.config.trace_id,
-                                agg_type=curr_agg_type)
+                                curr_agg_type))
+
+        #All of the aggregations are sent to the cache in a single round trip
+        self.config.redis_handler.save_many_to_cache(cache_entries)
 
         excel_bytes = BytesIO()
 
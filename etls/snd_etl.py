@@ -2,12 +2,67 @@ from bs4 import BeautifulSoup
 import re
 from datetime import datetime
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 import formats as fmts
-from typing import List, Tuple
+from typing import List, Tuple, Dict
 import pandas as pd
+import pyarrow as pa
 import network as network
 import os
 
+# Precompiled helpers for SNDETL.clean_deb_terms_column_names, which runs once per column of every debenture terms table
+_DEB_TERMS_ACCENTS_TABLE = str.maketrans({
+    'á': 'a', 'à': 'a', 'ã': 'a', 'â': 'a',
+    'é': 'e', 'ê': 'e',
+    'í': 'i',
+    'ó': 'o', 'ô': 'o', 'õ': 'o',
+    'ú': 'u', 'ü': 'u',
+    'ç': 'c'
+})
+_DEB_TERMS_SEPARATORS_REGEX    = re.compile(r'[/\(\)\-]')
+_DEB_TERMS_SPECIAL_CHARS_REGEX = re.compile(r'[^\w\s]')
+_DEB_TERMS_WHITESPACES_REGEX   = re.compile(r'\s+')
+_DEB_TERMS_UNDERSCORES_REGEX   = re.compile(r'_+')
+
+def concat_tables_with_unified_schema(tables: List[pa.Table]) -> pa.Table:
+    """
+    Concatenates arrow tables whose columns may be missing or have different types between them (e.g. an all-NaN double
+    column in one debenture and a string one in another, or int64 and double), which pa.concat_tables can't promote.
+    Each column gets the type its variants are permissively promoted to (e.g. int64 + double -> double, null + string -> string),
+    falling back to string when they have no common type. Missing columns are filled with nulls.
+    """
+    # Types of each column across the tables, in the format {column_name: [types]}, keeping the columns first seen order
+    columns_types : Dict[str, List[pa.DataType]] = dict()
+
+    for table in tables:
+        for field in table.schema:
+            columns_types.setdefault(field.name, list()).append(field.type)
+
+    unified_fields : List[pa.Field] = list()
+
+    for column_name, types in columns_types.items():
+
+        try:
+
+            unified_type = pa.unify_schemas([pa.schema([pa.field(column_name, curr_type)]) for curr_type in types],
+                                            promote_options="permissive").field(0).type
+
+        except (pa.ArrowTypeError, pa.ArrowInvalid, pa.ArrowNotImplementedError):
+
+            unified_type = pa.string()
+
+        unified_fields.append(pa.field(column_name, unified_type))
+
+    unified_schema = pa.schema(unified_fields)
+
+    unified_tables = [pa.Table.from_arrays([table.column(field.name).cast(field.type) if field.name in table.column_names
+                                            else pa.nulls(table.num_rows, field.type)
+                                            for field in unified_schema],
+                                           schema=unified_schema)
+                      for table in tables]
+
+    return pa.concat_tables(unified_tables)
+
 class SNDETL:
     """
     Class responsible for the ETL processes for SNDs's data through debentures.com.br portal
@@ -28,12 +83,21 @@ class SNDETL:
         self.http_fixed_time_session : network.requests.Session = network.create_http_session(fixed_delay_retry=10,backoff_factor=0)
         self.http_exp_backoff_session : network.requests.Session = network.create_http_session(backoff_factor=1)
 
+        # Datasource urls are resolved once per ETL instance instead of on every request
+        self.list_company_debentures_url : str = os.getenv("LIST_COMPANY_DEBENTURES_URL")
+        self.deb_financial_events_url : str = os.getenv("DEB_FINANCIAL_EVENTS_URL")
+        self.deb_terms_url : str = os.getenv("DEB_TERMS_URL")
+        self.deb_traded_prices_url : str = os.getenv("DEB_TRADED_PRICES_URL")
+
     ####SNDs' etl specific formats
 
     DATE_FORMAT = "%d/%m/%Y"
     DEB_ASSED_CODE_COLUM_NAME = "asset_code"
 
-    # This is the HTML table class used to fetch all of the debentures from a company in os.getenv('LIST_COMPANY_DEBENTURES_URL')
+    # Bronze layer uploads are executed in a background pool, created for each full ETL, so that they overlap with the TSV parsing
+    BRONZE_UPLOAD_WORKERS = 2
+
+    # This is the HTML table class used to fetch all of the debentures from a company in self.list_company_debentures_url
     LIST_DEBS_HTML_TABLE_CLASS = 'Tab10333333' 
 
     DEB_TERMS_COLUMNS_MAP = {
@@ -89,7 +153,7 @@ class SNDETL:
 
         raw_cnpj = self.config.get_company_cnpj_digits_only()
 
-        url = os.getenv("LIST_COMPANY_DEBENTURES_URL")
+        url = self.list_company_debentures_url
 
         payload=f"""op_exc=False&mnome={raw_cnpj}&ativo=&IPO=&icvm=&EscrituraPadronizada=&
                     cvm_ini=&cvm_fim=&emis_ini=&emis_fim=&venc_ini=&venc_fim=&
@@ -102,6 +166,7 @@ class SNDETL:
 
         headers = {
         'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+        'accept-encoding': 'gzip, deflate',
         'accept-language': 'en-US,en;q=0.9',
         'cache-control': 'max-age=0',
         'content-type': 'application/x-www-form-urlencoded',
@@ -167,21 +232,26 @@ class SNDETL:
             df['issuer'] = df['issuer'].str.strip()
             df['situation'] = df['situation'].str.strip()
 
-        assert not df.empty, self.config.logger.error("Could not parse the listing of debentures for the company. Check if this company has debentures listed in the datasource. Aborting execution...")
+        if df.empty:
+            error_msg = "Could not parse the listing of debentures for the company. Check if this company has debentures listed in the datasource. Aborting execution..."
+            self.config.logger.error(error_msg)
+            raise ValueError(error_msg)
 
         return df
 
-    def get_financial_events_schedule_df(self):
+    def get_financial_events_schedule_df(self, upload_pool: ThreadPoolExecutor):
         """
-        Function responsible for retrieving a given company's debenture's events schedules
+        Function responsible for retrieving a given company's debenture's events schedules.
+        The bronze layer uploads are submitted to 'upload_pool'
         """
         raw_cnpj = self.config.get_company_cnpj_digits_only()
 
-        url = os.getenv("DEB_FINANCIAL_EVENTS_URL").replace(fmts.PLACEHOLDER_VALUE,raw_cnpj)
+        url = self.deb_financial_events_url.replace(fmts.PLACEHOLDER_VALUE,raw_cnpj)
 
         payload=f'emissor={raw_cnpj}&ativo=&evento=&dt_ini=&dt_fim=&dt_pgto_ini=&dt_pgto_fim=&Submit32.x=34&Submit32.y=15'
         headers = {
         'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+        'accept-encoding': 'gzip, deflate',
         'accept-language': 'en-US,en;q=0.9',
         'cache-control': 'max-age=0',
         'content-type': 'application/x-www-form-urlencoded',
@@ -211,7 +281,8 @@ class SNDETL:
         
         self.config.logger.info(f"Saving extracted debenture events schedule to '{save_path}'...")
 
-        self.config.minio_handler.save_file_to_bucket(
+        landing_upload_future = upload_pool.submit(
+                                            self.config.minio_handler.save_file_to_bucket,
                                             save_path,
                                             BytesIO(response.content),
                                             fmts.create_ingest_ts(),
@@ -220,22 +291,35 @@ class SNDETL:
                                             fmts.ContentTypes.TSV,
                                             self.data_source
                                             )
-        
-        self.config.logger.info(f"Saved to bronze/landing with success...")
 
-        events_schedule_df = pd.read_csv(
-                            BytesIO(response.content),
-                            sep=fmts.SND_TSV_SEPARATOR,
-                            encoding=fmts.SND_ENCODING,
-                            skiprows=fmts.SND_FINANCIAL_EVENTS_TSV_SKIP_ROWS
-                            )
+        # The upload result is always checked, so its exception isn't lost when the parse fails
+        try:
+
+            events_schedule_df = pd.read_csv(
+                                BytesIO(response.content),
+                                sep=fmts.SND_TSV_SEPARATOR,
+                                encoding=fmts.SND_ENCODING,
+                                skiprows=fmts.SND_FINANCIAL_EVENTS_TSV_SKIP_ROWS
+                                )
+
+        finally:
+
+            landing_upload_future.result()
+
+        self.config.logger.info(f"Saved to bronze/landing with success...")
 
         expected_cols = ["Data do Evento","Data do Pagamento","Emissor","Ativo","Evento","Tipo","Taxa/Percentual","Liquidação"]
 
-        assert events_schedule_df.columns.to_list() == expected_cols, self.config.logger.error("The parsed debenture events schedule did not have the expected columns. Aborting etl...")
+        if events_schedule_df.columns.to_list() != expected_cols:
+            error_msg = "The parsed debenture events schedule did not have the expected columns. Aborting etl..."
+            self.config.logger.error(error_msg)
+            raise ValueError(error_msg)
 
         #When the request is valid but an invalid cnpj is passed, it returns the df with 1 row noting that no events schedule were found
-        assert events_schedule_df.shape[0] > 1, self.config.logger.error("No events schedule were found for the passed CNPJ. Please double check the passed CNPJ in the .env file. Aborting etl...")
+        if events_schedule_df.shape[0] <= 1:
+            error_msg = "No events schedule were found for the passed CNPJ. Please double check the passed CNPJ in the .env file. Aborting etl..."
+            self.config.logger.error(error_msg)
+            raise ValueError(error_msg)
 
         ref_date=datetime.today().strftime(fmts.DateTimeFormats.FORMATTED_DATE_ONLY.value)
 
@@ -248,7 +332,8 @@ class SNDETL:
         
         self.config.logger.info(f"Saving parsed DF as parquet to '{save_path}'...")
 
-        self.config.minio_handler.save_file_to_bucket(
+        raw_upload_future = upload_pool.submit(
+                                            self.config.minio_handler.save_file_to_bucket,
                                             save_path,
                                             BytesIO(response.content),
                                             fmts.create_ingest_ts(),
@@ -257,14 +342,20 @@ class SNDETL:
                                             fmts.ContentTypes.PARQUET,
                                             self.data_source
                                             )
-        
-        self.config.logger.info(f"Saved parquet to bronze/raw with success...")
 
-        events_schedule_df = events_schedule_df.rename(columns=self.DEB_EVENTS_SCHEDULE_COLUMNS_MAPS)
-        events_schedule_df = fmts.convert_brazilian_numbers_to_float(events_schedule_df,["rate_or_percent"])
-        events_schedule_df = events_schedule_df.astype(fmts.DocumentSchemas.DEBENTURE_AGENDA_EVENTOS.value)
+        try:
+
+            events_schedule_df = events_schedule_df.rename(columns=self.DEB_EVENTS_SCHEDULE_COLUMNS_MAPS)
+            events_schedule_df = fmts.convert_brazilian_numbers_to_float(events_schedule_df,["rate_or_percent"])
+            events_schedule_df = events_schedule_df.astype(fmts.DocumentSchemas.DEBENTURE_AGENDA_EVENTOS.value)
+
+            events_schedule_df = events_schedule_df.rename(columns=self.DEB_EVENTS_SCHEDULE_COLUMNS_MAPS)
 
-        events_schedule_df = events_schedule_df.rename(columns=self.DEB_EVENTS_SCHEDULE_COLUMNS_MAPS)
+        finally:
+
+            raw_upload_future.result()
+
+        self.config.logger.info(f"Saved parquet to bronze/raw with success...")
 
         return events_schedule_df
 
@@ -324,32 +415,19 @@ class SNDETL:
         "Ato Societario (1)" -> "ato_societario_1"
         "Quantidade  Cancelada" -> "quantidade_cancelada"
         """
-        # Convert to lowercase
-        name = name.lower()
-        
-        # Replace Portuguese special characters
-        replacements = {
-            'á': 'a', 'à': 'a', 'ã': 'a', 'â': 'a',
-            'é': 'e', 'ê': 'e',
-            'í': 'i',
-            'ó': 'o', 'ô': 'o', 'õ': 'o',
-            'ú': 'u', 'ü': 'u',
-            'ç': 'c'
-        }
-        
-        for old, new in replacements.items():
-            name = name.replace(old, new)
+        # Convert to lowercase and replace Portuguese special characters
+        name = name.lower().translate(_DEB_TERMS_ACCENTS_TABLE)
         
         # Replace special characters with underscore or remove
-        name = re.sub(r'[/\(\)\-]', '_', name)  # Replace /, (, ), - with _
-        name = re.sub(r'[^\w\s]', '', name)      # Remove other special chars
-        name = re.sub(r'\s+', '_', name)         # Replace spaces with _
-        name = re.sub(r'_+', '_', name)          # Replace multiple _ with single _
-        name = name.strip('_')                   # Remove leading/trailing _
+        name = _DEB_TERMS_SEPARATORS_REGEX.sub('_', name)     # Replace /, (, ), - with _
+        name = _DEB_TERMS_SPECIAL_CHARS_REGEX.sub('', name)   # Remove other special chars
+        name = _DEB_TERMS_WHITESPACES_REGEX.sub('_', name)    # Replace spaces with _
+        name = _DEB_TERMS_UNDERSCORES_REGEX.sub('_', name)    # Replace multiple _ with single _
+        name = name.strip('_')                                # Remove leading/trailing _
         
         return name
 
-    def get_treated_debenture_terms(self, debenture_code: str) -> dict:
+    def get_treated_debenture_terms(self, debenture_code: str, upload_pool: ThreadPoolExecutor) -> dict:
             """
             Scrape debenture terms from debentures.com.br
             
@@ -357,12 +435,14 @@ class SNDETL:
             -----------
             debenture_code : str
                 Debenture code (e.g., 'AMBP16')
+            upload_pool : ThreadPoolExecutor
+                Pool the bronze layer upload is submitted to
             
             Returns:
             --------
             dict with debenture terms
             """
-            url = os.getenv("DEB_TERMS_URL").replace(fmts.PLACEHOLDER_VALUE,debenture_code)
+            url = self.deb_terms_url.replace(fmts.PLACEHOLDER_VALUE,debenture_code)
 
             session = self.http_fixed_time_session
 
@@ -380,7 +460,8 @@ class SNDETL:
             
             self.config.logger.info(f"Saving extracted debenture terms schedule to '{save_path}'...")
 
-            self.config.minio_handler.save_file_to_bucket(
+            upload_future = upload_pool.submit(
+                                                self.config.minio_handler.save_file_to_bucket,
                                                 save_path,
                                                 BytesIO(response.content),
                                                 fmts.create_ingest_ts(),
@@ -389,15 +470,22 @@ class SNDETL:
                                                 fmts.ContentTypes.TSV,
                                                 self.data_source
                                                 )
+
+            # The upload result is always checked, so its exception isn't lost when the parse fails
+            try:
+
+                deb_terms_df = pd.read_csv(
+                                BytesIO(response.content),
+                                sep=fmts.SND_TSV_SEPARATOR,
+                                encoding=fmts.SND_ENCODING,
+                                skiprows=fmts.SND_DEB_TERMS_TSV_SKIP_ROWS
+                                )
+
+            finally:
+
+                upload_future.result()
             
             self.config.logger.info("File saved with success")
-
-            deb_terms_df = pd.read_csv(
-                            BytesIO(response.content),
-                            sep=fmts.SND_TSV_SEPARATOR,
-                            encoding=fmts.SND_ENCODING,
-                            skiprows=fmts.SND_DEB_TERMS_TSV_SKIP_ROWS
-                            )
             
             mapped_columns = set()
             result = pd.DataFrame()
@@ -449,10 +537,14 @@ class SNDETL:
             return result
 
 
-    def get_treated_deb_traded_prices(self) -> pd.DataFrame:
+    def get_treated_deb_traded_prices(self, upload_pool: ThreadPoolExecutor) -> pd.DataFrame:
         """
         Downloads the TSV file from debentures.com.br and treats the contents in order to get the company's debenture's trading prices
 
+        Parameters:
+
+            upload_pool (ThreadPoolExecutor) : Pool the bronze layer upload is submitted to
+
         Returns:
 
             pd.DataFrame : Dataframe containing the treated traded debenture prices for this compay
@@ -460,11 +552,12 @@ class SNDETL:
 
         digits_only_company_cnpj = self.config.get_company_cnpj_digits_only()
                 
-        url = os.getenv("DEB_TRADED_PRICES_URL").replace(fmts.PLACEHOLDER_VALUE,digits_only_company_cnpj)
+        url = self.deb_traded_prices_url.replace(fmts.PLACEHOLDER_VALUE,digits_only_company_cnpj)
 
         payload=f'op_exc=False&emissor={digits_only_company_cnpj}4&ativo=&ISIN=&dt_ini=&dt_fim=&Submit32.x=32&Submit32.y=19'
         headers = {
         'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+        'accept-encoding': 'gzip, deflate',
         'accept-language': 'en-US,en;q=0.9',
         'cache-control': 'max-age=0',
         'content-type': 'application/x-www-form-urlencoded',
@@ -495,7 +588,10 @@ class SNDETL:
                                     )
         
         #When the request is valid but an invalid cnpj is passed, it returns the df with 1 row noting that no events schedule were found
-        assert traded_prices_df.shape[0] > 1, self.config.logger.error("No traded prices were found for the passed CNPJ. Please double check the passed CNPJ in the .env file. Aborting etl...")
+        if traded_prices_df.shape[0] <= 1:
+            error_msg = "No traded prices were found for the passed CNPJ. Please double check the passed CNPJ in the .env file. Aborting etl..."
+            self.config.logger.error(error_msg)
+            raise ValueError(error_msg)
 
         ref_date = fmts.create_ref_date(datetime.today())
 
@@ -508,7 +604,8 @@ class SNDETL:
         
         self.config.logger.info(f"Saving extracted traded prices to '{save_path}'...")
 
-        self.config.minio_handler.save_file_to_bucket(
+        upload_future = upload_pool.submit(
+                                            self.config.minio_handler.save_file_to_bucket,
                                             save_path,
                                             BytesIO(response.content),
                                             fmts.create_ingest_ts(),
@@ -520,9 +617,16 @@ class SNDETL:
         
         self.config.logger.info("Treating the obtained trade prices dataframe...")
 
-        traded_prices_df = traded_prices_df.rename(columns=self.DEB_TRADED_PRICES_COLUMNS_MAPS)
+        # The upload result is always checked, so its exception isn't lost when the treatment fails
+        try:
+
+            traded_prices_df = traded_prices_df.rename(columns=self.DEB_TRADED_PRICES_COLUMNS_MAPS)
 
-        traded_prices_df = fmts.convert_brazilian_numbers_to_float(traded_prices_df, self.DEB_PRICES_FLOAT_COLUMNS)
+            traded_prices_df = fmts.convert_brazilian_numbers_to_float(traded_prices_df, self.DEB_PRICES_FLOAT_COLUMNS)
+
+        finally:
+
+            upload_future.result()
 
         return traded_prices_df
 
@@ -543,7 +647,10 @@ class SNDETL:
 
             self.config.logger.info("Starting the ETL for the debenture's financial events schedule...")
 
-            events_df = self.get_financial_events_schedule_df()
+            # The pool is shut down as soon as the bronze layer uploads are collected, so that it doesn't outlive the ETL
+            with ThreadPoolExecutor(max_workers=self.BRONZE_UPLOAD_WORKERS) as upload_pool:
+
+                events_df = self.get_financial_events_schedule_df(upload_pool)
 
             #This is done because the 'tipo' column comes duplicated from the datasource
             events_df["yield_type"] = events_df["yield_type"].apply(lambda x: x[:len(x)//2])
@@ -572,8 +679,8 @@ class SNDETL:
                 
             self.config.logger.info("All debenture schedule events moved to gold/serving and gold/export. Finishing financial events schedule ETL with success...")
 
-            self.config.redis_handler.save_to_cache(fmts.GoldServingTableNames.DEB_EVENTS_SCHEDULE,
-                                        events_df.to_dict(orient="records"),
+            self.config.redis_handler.save_df_to_cache(fmts.GoldServingTableNames.DEB_EVENTS_SCHEDULE,
+                                        events_df,
                                         datetime.today(),
                                         self.config.trace_id)
 
@@ -611,21 +718,24 @@ class SNDETL:
             ref_date = fmts.create_ref_date(datetime.today())
             debs_amt = len(company_debenture_codes)
 
-            deb_dfs_list = list()
+            deb_tables_list : List[pa.Table] = list()
 
-            for idx,curr_asset_code in enumerate(company_debenture_codes):
+            with ThreadPoolExecutor(max_workers=self.BRONZE_UPLOAD_WORKERS) as upload_pool:
 
-                self.config.logger.info(f"Getting terms for debenture '{curr_asset_code}'. Progress: {idx}/{debs_amt}")
+                for idx,curr_asset_code in enumerate(company_debenture_codes):
 
-                debenture_terms_df = self.get_treated_debenture_terms(curr_asset_code)
+                    self.config.logger.info(f"Getting terms for debenture '{curr_asset_code}'. Progress: {idx}/{debs_amt}")
 
-                self.config.logger.info(f"terms for debenture '{curr_asset_code}' fetched and treated with success.")
+                    debenture_terms_df = self.get_treated_debenture_terms(curr_asset_code, upload_pool)
 
-                deb_dfs_list.append(debenture_terms_df)
+                    self.config.logger.info(f"terms for debenture '{curr_asset_code}' fetched and treated with success.")
 
-                self.config.logger.info(f"Debenture '{curr_asset_code}' terms processed with success...")
+                    deb_tables_list.append(pa.Table.from_pandas(debenture_terms_df, preserve_index=False))
 
-            final_consolidated_df = pd.concat(deb_dfs_list,ignore_index=True)
+                    self.config.logger.info(f"Debenture '{curr_asset_code}' terms processed with success...")
+
+            #Arrow concatenation only stitches the tables' chunks together, avoiding the full copy done by pd.concat. The columns types are unified first, since they vary between debentures
+            final_consolidated_df = concat_tables_with_unified_schema(deb_tables_list).to_pandas()
 
             #Convert dtype 'object' columns to string to allow for parquet storage
             final_consolidated_df = final_consolidated_df.astype({col: "string" for col in final_consolidated_df.select_dtypes(include="object").columns})
@@ -640,8 +750,8 @@ class SNDETL:
 
             self.config.logger.info(f"All of the debenture terms were processed with success. Starting to move them to gold layer...")
 
-            self.config.redis_handler.save_to_cache(fmts.GoldServingTableNames.DEB_TERMS,
-                                final_consolidated_df.to_dict(orient="records"),
+            self.config.redis_handler.save_df_to_cache(fmts.GoldServingTableNames.DEB_TERMS,
+                                final_consolidated_df,
                                 datetime.today(),
                                 self.config.trace_id)
 
@@ -671,13 +781,19 @@ class SNDETL:
 
             self.config.logger.info(f"The following debenture's data were found (listing only first 10 entries): {company_debs_df.head(10)}")
             
-            traded_prices_df = self.get_treated_deb_traded_prices()
+            with ThreadPoolExecutor(max_workers=self.BRONZE_UPLOAD_WORKERS) as upload_pool:
+
+                traded_prices_df = self.get_treated_deb_traded_prices(upload_pool)
 
             #This warning is issued when at least one of the company's issued debenture's traded prices were not found in the secondary market trading prices
-            if len(traded_prices_df[self.DEB_ASSED_CODE_COLUM_NAME].unique()) != len(company_debs_df[self.DEB_ASSED_CODE_COLUM_NAME].unique()):
+            company_deb_codes = pd.Index(company_debs_df[self.DEB_ASSED_CODE_COLUM_NAME].unique())
+            traded_deb_codes = pd.Index(traded_prices_df[self.DEB_ASSED_CODE_COLUM_NAME].unique())
+            missing_deb_codes = company_deb_codes.difference(traded_deb_codes)
+
+            if not missing_deb_codes.empty:
                 self.config.logger.warning(f"""At least one of the companies debentures were not found in the secondary market trading prices.
-                                            Company debenture's codes : {company_debs_df[self.DEB_ASSED_CODE_COLUM_NAME].unique()} | 
-                                            Company debenture's trading prices found for : {traded_prices_df[self.DEB_ASSED_CODE_COLUM_NAME].unique()}
+                                            Company debenture's codes missing : {missing_deb_codes.tolist()} | 
+                                            Company debenture's trading prices found for : {traded_deb_codes.tolist()}
                                             """)
 
             self.config.logger.info("All treated debenture's secondary market traded prices obtained with success, moving to gold layer...")
@@ -694,8 +810,8 @@ class SNDETL:
             
             self.config.logger.info("ETL for the secondary market trade prices of the debenture's finished with success...")
 
-            self.config.redis_handler.save_to_cache(fmts.GoldServingTableNames.DEB_SECONDARY_MARKET_TRADED_PRICES,
-                                traded_prices_df.to_dict(orient="records"),
+            self.config.redis_handler.save_df_to_cache(fmts.GoldServingTableNames.DEB_SECONDARY_MARKET_TRADED_PRICES,
+                                traded_prices_df,
                                 datetime.today(),
                                 self.config.trace_id)
 
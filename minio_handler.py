@@ -2,14 +2,32 @@ from minio import Minio
 from minio.error import S3Error
 from minio.commonconfig import ENABLED
 from minio.versioningconfig import VersioningConfig
+import urllib3
 import logging
 from io import BytesIO
 from typing import Optional, Tuple
 from file_operations import create_put_obj_metadata
 from formats import DocumentTypes, DataSources, CVMDocumentAggregationType, BucketCustomMetadata, ContentTypes
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
+import os
+
+
+def get_bytes_io_length(file_bytes: BytesIO) -> int:
+    """
+    Returns the size of a BytesIO buffer without copying it (as BytesIO.getvalue() does), keeping its current position
+    """
+    curr_pos = file_bytes.tell()
+    length = file_bytes.seek(0, os.SEEK_END)
+    file_bytes.seek(curr_pos)
+    return length
 
 class MinioHandler:
+    # Max amount of connections kept alive to the MinIO host
+    HTTP_POOL_MAXSIZE = 32
+    # Threads used to stat the files of a folder being scanned, kept below HTTP_POOL_MAXSIZE
+    FOLDER_SCAN_MAX_WORKERS = 16
+
     def __init__(self,logger: logging.Logger, bucket_name: str,host: str, port: str, username: str, password: str):
         self.bucket_name = bucket_name
         self.host = host
@@ -18,12 +36,21 @@ class MinioHandler:
         self.password = password
         self.logger = logger
 
-        # Initialize the MinIO client
+        # Initialize the MinIO client. The HTTP pool mirrors MinIO's default one, but sized for concurrent uploads/stats
+        http_client = urllib3.PoolManager(
+            num_pools=8,
+            maxsize=self.HTTP_POOL_MAXSIZE,
+            block=True,
+            timeout=urllib3.Timeout(connect=300, read=300),
+            retries=urllib3.Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504])
+        )
+
         self.client = Minio(
             f"{self.host}:{self.port}",
             access_key=self.username, 
             secret_key=self.password, 
-            secure=False
+            secure=False,
+            http_client=http_client
         )
         try:
             self.client.list_buckets()
@@ -91,6 +118,178 @@ class MinioHandler:
         self.logger.info(f"Medallion pattern layout created with success")
 
 
+    # The hash index maps each folder's files hashes to their paths as '<HASH_INDEX_PREFIX>/<folder>/<file_hash>' objects
+    # holding the file path, so upload deduplication takes a single GET request instead of a folder listing
+    HASH_INDEX_PREFIX = "_index"
+    # Written once all of a folder's pre-existing files were added to the hash index
+    HASH_INDEX_FOLDER_MARKER = ".indexed"
+
+    def object_exists(self, object_name: str) -> bool:
+        """
+        Checks if an object exists in the bucket through stat_object()
+        """
+        try:
+            self.client.stat_object(self.bucket_name, object_name)
+            return True
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                return False
+            raise
+
+    def get_file_hash(self, object_name: str) -> Optional[str]:
+        """
+        Returns the file hash saved in an object custom metadata, or None if the object doesn't exist or has no hash
+        """
+        try:
+            return self.client.stat_object(self.bucket_name, object_name).metadata.get(BucketCustomMetadata.FILE_HASH.value, None)
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                return None
+            raise
+
+    def add_file_hash_to_index(self, parent_folder: Path, file_hash: str, file_path: str):
+        """
+        Adds a file to its folder hash index
+        """
+        file_path_bytes = file_path.encode()
+
+        self.client.put_object(
+            bucket_name=self.bucket_name,
+            object_name=f"{self.HASH_INDEX_PREFIX}/{parent_folder}/{file_hash}",
+            data=BytesIO(file_path_bytes),
+            length=len(file_path_bytes),
+            content_type="text/plain")
+
+    def get_indexed_file_path(self, parent_folder: Path, file_hash: str) -> Optional[str]:
+        """
+        Returns the file path saved in the folder hash index for the passed file hash, or None if it isn't indexed
+        """
+        try:
+            response = self.client.get_object(self.bucket_name, f"{self.HASH_INDEX_PREFIX}/{parent_folder}/{file_hash}")
+            try:
+                return response.read().decode()
+            finally:
+                response.close()
+                response.release_conn()
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                return None
+            raise
+
+    def remove_file_hash_from_index(self, parent_folder: Path, file_hash: str):
+        """
+        Removes a file hash from its folder hash index, e.g. when the indexed file was overwritten with another content
+        """
+        self.client.remove_object(self.bucket_name, f"{self.HASH_INDEX_PREFIX}/{parent_folder}/{file_hash}")
+
+    def find_file_hash_in_folder(self, parent_folder: Path, file_hash: str) -> Optional[str]:
+        """
+        Returns the path of the file inside 'parent_folder' with the passed file hash, or None if there isn't any.
+        The folder hash index is used, and folders with files uploaded before the index existed are scanned (and indexed) once.
+        Index hits are checked against the indexed file current hash, so entries left by overwritten files aren't trusted.
+        """
+        index_folder = f"{self.HASH_INDEX_PREFIX}/{parent_folder}"
+
+        indexed_file_path = self.get_indexed_file_path(parent_folder, file_hash)
+
+        if indexed_file_path:
+
+            if self.get_file_hash(indexed_file_path) == file_hash:
+                return indexed_file_path
+
+            self.logger.warning(f"The hash index entry of file '{indexed_file_path}' is stale (the file was overwritten or removed), removing it...")
+            self.remove_file_hash_from_index(parent_folder, file_hash)
+
+        if self.object_exists(f"{index_folder}/{self.HASH_INDEX_FOLDER_MARKER}"):
+            return None
+
+        self.logger.info(f"Folder '{parent_folder}' has no hash index yet, indexing its files...")
+
+        list_obj_ret = self.client.list_objects(
+                                                bucket_name=self.bucket_name,
+                                                prefix=f"{parent_folder}/",
+                                                recursive = True
+                                            )
+        
+        def index_file(curr_file_in_parent_folder: str) -> Optional[str]:
+
+            curr_file_hash = self.get_file_hash(curr_file_in_parent_folder)
+
+            if curr_file_hash:
+                self.add_file_hash_to_index(parent_folder, curr_file_hash, curr_file_in_parent_folder)
+
+            return curr_file_hash
+
+        running_futures = dict()
+
+        def find_duplicate_in_finished(return_when: str) -> Optional[str]:
+
+            finished_futures, _ = wait(running_futures, return_when=return_when)
+
+            for future in finished_futures:
+
+                curr_file_in_parent_folder = running_futures.pop(future)
+
+                if file_hash == future.result():
+                    return curr_file_in_parent_folder
+
+            return None
+
+        duplicate_file_path = None
+
+        # Files found by the scan listing, so the ones written by concurrent uploads are indexed after it
+        scanned_files = set()
+
+        # The stat/put requests are network bound, so they are spread across threads. The listing is consumed lazily,
+        # keeping at most FOLDER_SCAN_MAX_WORKERS requests in flight, so the scan stops as soon as the duplicate is found
+        with ThreadPoolExecutor(max_workers=self.FOLDER_SCAN_MAX_WORKERS) as executor:
+
+            for obj in list_obj_ret:
+
+                if obj.object_name.endswith("/"):
+                    continue
+
+                scanned_files.add(obj.object_name)
+
+                running_futures[executor.submit(index_file, obj.object_name)] = obj.object_name
+
+                if len(running_futures) >= self.FOLDER_SCAN_MAX_WORKERS:
+
+                    duplicate_file_path = find_duplicate_in_finished(FIRST_COMPLETED)
+
+                    if duplicate_file_path:
+                        break
+
+            if duplicate_file_path:
+                for future in running_futures:
+                    future.cancel()
+            else:
+                duplicate_file_path = find_duplicate_in_finished(ALL_COMPLETED)
+
+        if running_futures or duplicate_file_path:
+            return duplicate_file_path
+
+        # The folder is only marked as indexed once it was fully scanned
+        self.client.put_object(
+            bucket_name=self.bucket_name,
+            object_name=f"{index_folder}/{self.HASH_INDEX_FOLDER_MARKER}",
+            data=BytesIO(b" "),
+            length=1,
+            content_type="application/octet-stream")
+
+        # Files written while the folder was being scanned may have missed both the scan listing and the marker,
+        # so the folder is listed again and its new files are indexed too
+        new_files = [obj.object_name for obj in self.client.list_objects(bucket_name=self.bucket_name, prefix=f"{parent_folder}/", recursive=True)
+                     if not obj.object_name.endswith("/") and obj.object_name not in scanned_files]
+
+        if new_files:
+            with ThreadPoolExecutor(max_workers=self.FOLDER_SCAN_MAX_WORKERS) as executor:
+                for curr_file_in_parent_folder, curr_file_hash in zip(new_files, executor.map(index_file, new_files)):
+                    if curr_file_hash == file_hash:
+                        duplicate_file_path = curr_file_in_parent_folder
+
+        return duplicate_file_path
+
     def get_file_bytes_and_metadata(self,file_path: str) -> Tuple[BytesIO,dict[str,str]]:
         """
         Gets the object content from MinIO`s get_object() and the metadata from stat_object()
@@ -149,29 +348,32 @@ class MinioHandler:
 
         parent_folder = Path(save_file_path).parent
 
-        list_obj_ret = self.client.list_objects(
-                                                bucket_name=self.bucket_name,
-                                                prefix=f"{parent_folder}/",
-                                                recursive = True
-                                            )
-        
-        file_paths = [obj.object_name for obj in list_obj_ret if not obj.object_name.endswith("/")]
+        duplicate_file_path = self.find_file_hash_in_folder(parent_folder, new_file_hash)
 
-        for curr_file_in_parent_folder in file_paths:
+        if duplicate_file_path:
+            self.logger.warning(f"The file trying to be uploaded already exists as of path '{duplicate_file_path}'. Aborting upload...")
+            return
 
-            curr_file_metadata = self.client.stat_object(self.bucket_name,curr_file_in_parent_folder).metadata
+        # Hash of the file being overwritten, whose index entry must not point to this path anymore
+        overwritten_file_hash = self.get_file_hash(save_file_path)
 
-            if new_file_hash == curr_file_metadata.get(BucketCustomMetadata.FILE_HASH.value,None):
-                self.logger.warning(f"The file trying to be uploaded already exists as of path '{curr_file_in_parent_folder}'. Aborting upload...")
-                return
+        # put_object reads from the buffer's current position
+        file_bytes.seek(0)
 
         self.client.put_object(
             bucket_name=self.bucket_name,
             object_name=save_file_path,
             data=file_bytes,  
-            length=len(file_bytes.getvalue()),
+            length=get_bytes_io_length(file_bytes),
             content_type=content_type.value,
             metadata=metadata)
+
+        self.add_file_hash_to_index(parent_folder, new_file_hash, save_file_path)
+
+        # The overwritten content is only removed from the index if it was indexed as this file, and not as a copy of it
+        if (overwritten_file_hash and overwritten_file_hash != new_file_hash
+                and self.get_indexed_file_path(parent_folder, overwritten_file_hash) == save_file_path):
+            self.remove_file_hash_from_index(parent_folder, overwritten_file_hash)
         
         self.logger.info(f"File uplodaded with success to '{save_file_path}'")
     
@@ -20,15 +20,19 @@ class FixedDelayRetry(Retry):
         time.sleep(self.delay)
 
 
-def create_http_session(fixed_delay_retry: Optional[int] = None,backoff_factor: int = 1) -> requests.session:
+def create_http_session(fixed_delay_retry: Optional[int] = None,backoff_factor: int = 1, pool_maxsize: int = 32) -> requests.session:
     """
     Creates the HTTP session to be used across all data scrapings.
     It implements an exponential backoff to improve robustness and in order not to overload the target website.
     The exponential backoff can be overriden by setting it to 0 to adhere a specific data source crawler requirement found in robots.txt
+    Connections are kept alive and pooled (up to 'pool_maxsize' per host) and compressed responses are requested.
     """
 
     session = requests.Session()
 
+    # Brotli is not requested since the 'brotli' package isn't a dependency and the response wouldn't be decoded
+    session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+
     if fixed_delay_retry:
         retry_strategy = FixedDelayRetry(
             total=5,
@@ -46,7 +50,7 @@ def create_http_session(fixed_delay_retry: Optional[int] = None,backoff_factor:
         )
 
     # Mount the adapter with the retry strategy
-    adapter = HTTPAdapter(max_retries=retry_strategy)
+    adapter = HTTPAdapter(max_retries=retry_strategy, pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, pool_block=False)
     session.mount("https://", adapter)
     session.mount("http://", adapter)
 
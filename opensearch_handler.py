@@ -1,5 +1,5 @@
-import json
 import time
+import math
 import hashlib
 from datetime import datetime
 from typing import List, Dict, Callable, Optional, Any, Iterable
@@ -24,7 +24,8 @@ class OpensearchHandler:
                 host: str,
                 port: int,
                 password: str,
-                use_gpu_for_embeddings: bool = False
+                use_gpu_for_embeddings: bool = False,
+                quantize_embeddings_to_int8: bool = False
                 ):
         self.logger = logger
         self.client = OpenSearch(hosts=[{"host": host, "port": port}],http_auth=("admin",password))
@@ -32,11 +33,29 @@ class OpensearchHandler:
         self.embeddings_dim = embeddings_dim
         self.embedding_model_name = embeddings_model_name
         self.device = "cuda" if (use_gpu_for_embeddings and torch.cuda.is_available()) else "cpu"
+        # Loaded once and reused by every embeddings computation, as loading the weights dominates the cost for small batches
+        self.embeddings_model = SentenceTransformer(self.embedding_model_name, device=self.device)
+        if self.device == "cuda":
+            # fp16 weights use the GPU tensor cores, the vectors are stored as fp16 by the index anyway
+            self.embeddings_model.half()
+        # When enabled, vectors are quantized to int8 before being sent and stored as 'byte' knn vectors (4x smaller than fp32)
+        self.quantize_embeddings_to_int8 = quantize_embeddings_to_int8
+
+    # Amount of chunks embedded (and bulk indexed) together while ingesting a file
+    EMBEDDINGS_BATCH_SIZE = 64
+    # knn engine used by the embeddings HNSW graph
+    KNN_ENGINE = "faiss"
+    # Symmetric scale of the int8 quantization. The components of L2 normalized vectors are within [-1, 1], so none is clipped
+    QUANTIZATION_SCALE = 127
+    # Index mapping '_meta' key holding the int8 quantization scale the index vectors were stored with
+    QUANTIZATION_SCALE_META_KEY = "embedding_quantization_scale"
+    # helpers.parallel_bulk settings used while ingesting a file
+    BULK_THREAD_COUNT = 4
+    BULK_CHUNK_SIZE = 500
 
     def get_embeddings_multi_qa(self,
         texts: List[str],
         batch_size: int = 64,
-        device: Optional[str] = None,
         normalize: bool = True,
     ) -> List[List[float]]:
         """
@@ -46,7 +65,6 @@ class OpensearchHandler:
             texts: List of input strings to embed.
             model_name: Hugging Face / sentence-transformers model name (default: multi-qa-MiniLM-L6-dot-v1).
             batch_size: Batch size for encoding (tune for memory / speed).
-            device: torch device string ("cpu" or "cuda"). If None, auto-detects.
             normalize: If True, returns L2-normalized vectors (useful for cosine similarity).
 
         Returns:
@@ -57,57 +75,77 @@ class OpensearchHandler:
             embs = get_embeddings_multi_qa(["texto em português", "outra frase"])
             # embs -> [[0.123, ...], [0.234, ...]]
         """
-        model = SentenceTransformer(self.embedding_model_name, device=device)
-
-        # sanitize inputs and compute embeddings in batches
-        cleaned_texts: List[str] = []
-        original_to_idx = []  # map to keep position of empty strings
-        for i, t in enumerate(texts):
-            if t is None:
-                cleaned_texts.append("")
-                original_to_idx.append(i)
-            else:
-                # basic normalization: strip and collapse whitespace
-                s = " ".join(str(t).split())
-                cleaned_texts.append(s)
-                original_to_idx.append(i)
-
-        embeddings = []
-        for start in range(0, len(cleaned_texts), batch_size):
-            batch = cleaned_texts[start : start + batch_size]
-            batch_emb = model.encode(batch, show_progress_bar=False, convert_to_numpy=True)
-            if normalize:
-                # L2-normalize (common for cosine similarity)
-                norms = np.linalg.norm(batch_emb, axis=1, keepdims=True)
-                norms[norms == 0] = 1.0
-                batch_emb = batch_emb / norms
-            # convert to python floats
-            for vec in batch_emb:
-                embeddings.append(vec.astype(float).tolist())
-
-        # safety: embeddings length should match inputs
-        if len(embeddings) != len(texts):
-            # This should not happen, but fail loudly if mismatch
-            raise RuntimeError(f"Embeddings count {len(embeddings)} != texts count {len(texts)}")
+        # sanitize inputs: None becomes an empty string, the others are stripped and have their whitespaces collapsed
+        cleaned_texts: List[str] = ["" if t is None else " ".join(str(t).split()) for t in texts]
+
+        # inference mode disables autograd bookkeeping during the forward pass
+        with torch.inference_mode():
+            embeddings = self.embeddings_model.encode(
+                                                        cleaned_texts,
+                                                        batch_size=batch_size,
+                                                        show_progress_bar=False,
+                                                        convert_to_numpy=True,
+                                                        normalize_embeddings=normalize
+                                                    ).tolist()
 
         return embeddings
 
-    # ---------- helpers ----------
-    def ensure_embedding_list(self,emb: Any) -> List[float]:
+    # ---------- index utilities ----------
+    def get_embedding_field_mapping(self) -> Dict:
         """
-        Ensure embedding is a plain Python list of floats.
-        Accepts numpy arrays, lists, etc.
+        Returns the 'embedding' knn_vector field mapping.
+        fp32 vectors are stored as fp16 through faiss' scalar quantization encoder, while client side int8 quantized vectors
+        are stored as 'byte' vectors, compared through inner product. As every vector is normalized and scaled by the same
+        QUANTIZATION_SCALE, the inner product is the cosine similarity times QUANTIZATION_SCALE², keeping the same ranking
         """
-        if emb is None:
-            return None
-        if isinstance(emb, np.ndarray):
-            return emb.astype(float).tolist()
-        if isinstance(emb, list):
-            return [float(x) for x in emb]
-        # fallback
-        return json.loads(json.dumps(emb))
+        if self.quantize_embeddings_to_int8:
+            return {
+                "type": "knn_vector",
+                "dimension": self.embeddings_dim,
+                "data_type": "byte",
+                "method": {
+                    "name": "hnsw",
+                    "space_type": "innerproduct",
+                    "engine": self.KNN_ENGINE,
+                    "parameters": {"ef_construction": 256, "m": 48}
+                }
+            }
+
+        return {
+            "type": "knn_vector",
+            "dimension": self.embeddings_dim,
+            "method": {
+                "name": "hnsw",
+                "space_type": "cosinesimil",
+                "engine": self.KNN_ENGINE,
+                "parameters": {
+                    "ef_construction": 256,
+                    "m": 48,
+                    "encoder": {"name": "sq", "parameters": {"type": "fp16"}}    # vectors stored as fp16, halving their memory
+                }
+            }
+        }
+
+    def quantize_embeddings(self, embeddings: List[List[float]]) -> List[List[int]]:
+        """
+        Quantizes L2 normalized embeddings to int8 through the symmetric QUANTIZATION_SCALE.
+        The scale doesn't depend on the data, so documents and queries of every index are quantized the same way
+        """
+        scaled_embeddings = np.rint(np.asarray(embeddings, dtype=np.float32) * self.QUANTIZATION_SCALE)
+
+        return np.clip(scaled_embeddings, -128, 127).astype(np.int8).tolist()
+
+    def get_query_embedding(self, query: str) -> List[float]:
+        """
+        Returns the embedding of a search query, quantized as the index vectors when int8 quantization is enabled
+        """
+        embedding = self.get_embeddings_multi_qa([query], batch_size=1)
+
+        if self.quantize_embeddings_to_int8:
+            embedding = self.quantize_embeddings(embedding)
+
+        return embedding[0]
 
-    # ---------- index utilities ----------
     def ensure_index(self, index_name: str):
         """
         Create the index with recommended mapping if it doesn't exist.
@@ -125,6 +163,19 @@ class OpensearchHandler:
                     dim = emb_field.get("dimension")
                 if dim and dim != self.embeddings_dim:
                     raise ValueError(f"Index '{index_name}' already exists with embedding dimension {dim}, expected {self.embeddings_dim}")
+                # vectors stored with another data type (or int8 scale) wouldn't be comparable to the ones being ingested
+                data_type = emb_field.get("data_type", "float")
+                expected_data_type = "byte" if self.quantize_embeddings_to_int8 else "float"
+                if data_type != expected_data_type:
+                    raise ValueError(f"Index '{index_name}' already exists with embedding data type '{data_type}', expected '{expected_data_type}'")
+                if self.quantize_embeddings_to_int8:
+                    scale = mapping.get("_meta", {}).get(self.QUANTIZATION_SCALE_META_KEY)
+                    if scale != self.QUANTIZATION_SCALE:
+                        raise ValueError(f"Index '{index_name}' already exists with int8 quantization scale '{scale}', expected '{self.QUANTIZATION_SCALE}'. Recreate the index and reindex its documents")
+                # indexes created before the move to faiss keep working, but need a reindex to get the fp16 vector storage
+                engine = emb_field.get("method", {}).get("engine")
+                if engine and engine != self.KNN_ENGINE:
+                    self.logger.warning(f"Index '{index_name}' uses the knn engine '{engine}' instead of '{self.KNN_ENGINE}'. Recreate the index and reindex its documents to use it")
             return
 
         body = {
@@ -152,19 +203,12 @@ class OpensearchHandler:
                     "document_type": {"type": "keyword"},              # Type/category of document
                     "ref_date": {"type": "date"},                      # Reference date of document
                     "aggregation_type": {"type": "keyword"},           # Optional, CVM ITR and DPF specific
-                    "embedding": {
-                        "type": "knn_vector",
-                        "dimension": self.embeddings_dim,
-                        "method": {
-                            "name": "hnsw",
-                            "space_type": "cosinesimil",
-                            "engine": "nmslib",
-                            "parameters": {"ef_construction": 256, "m": 48}
-                        }
-                    }
+                    "embedding": self.get_embedding_field_mapping()
                 }
             }
         }
+        if self.quantize_embeddings_to_int8:
+            body["mappings"]["_meta"] = {self.QUANTIZATION_SCALE_META_KEY: self.QUANTIZATION_SCALE}
         self.client.indices.create(index=index_name, body=body, ignore=400)
         # optionally wait for green
         self.client.cluster.health(wait_for_status="yellow", timeout=60)
@@ -198,12 +242,11 @@ class OpensearchHandler:
 
         chunks = file_data_and_chunks["chunks"]
 
-        search_results = self.client.search(index=index_name, body={"query":{"term": {"doc_id.keyword": bucket_file_path}}},size=500)
-
-        chunks_found_for_file = [hit["_id"] for hit in search_results['hits']['hits']]
+        # count only returns the amount of matches, regardless of how many chunks the file has
+        amt_of_chunks_found_for_file = self.client.count(index=index_name, body={"query":{"term": {"doc_id": bucket_file_path}}})["count"]
 
-        if not force_reindex and (len(chunks_found_for_file) == len(chunks)):
-            self.logger.warning(f"All {len(chunks_found_for_file)} chunks for file '{bucket_file_path}' are already present at OpenSearch's index '{index_name}'. Skipping this file's indexing...")
+        if not force_reindex and (amt_of_chunks_found_for_file == len(chunks)):
+            self.logger.warning(f"All {amt_of_chunks_found_for_file} chunks for file '{bucket_file_path}' are already present at OpenSearch's index '{index_name}'. Skipping this file's indexing...")
             return
 
         # 2) temporarily speed up bulk by pausing refresh
@@ -215,32 +258,25 @@ class OpensearchHandler:
             # not fatal, continue
             pass
 
-        # 3) iterate in batches, compute embeddings if needed, bulk index
-        batch = []
-        docs_in_batch = []
+        # 3) stream the actions (embedding chunks in minibatches) into parallel bulk requests, retrying the failed chunks
         total = 0
 
-        def flush_batch(b):
-            nonlocal total
-            if not b:
-                return
-            tries = 0
-            while tries < max_retries:
-                try:
-                    # helpers.bulk handles newline separated operations efficiently
-                    success, info = helpers.bulk(self.client, b, stats_only=False, raise_on_error=False)
-                    total += success
-                    break
-                except Exception as exc:
-                    tries += 1
-                    self.logger.error(f"bulk failed (attempt {tries}/{max_retries}): {exc}")
-                    time.sleep(2 ** tries)
-            b.clear()
+        # file level fields shared by all of the file's chunks, read from the metadata only once
+        file_level_fields = {
+            "doc_id": bucket_file_path,
+            "ingestion_ts": file_metadata[fmts.BucketCustomMetadata.INGEST_TS.value],
+            "source": file_metadata[fmts.BucketCustomMetadata.SOURCE.value],
+            "file_hash": file_metadata[fmts.BucketCustomMetadata.FILE_HASH.value],
+            "trace_id": file_metadata[fmts.BucketCustomMetadata.TRACE_ID.value],
+            "document_type": file_metadata[fmts.BucketCustomMetadata.DOCUMENT_TYPE.value],
+            "ref_date": file_metadata[fmts.BucketCustomMetadata.REF_DATE.value],
+            "aggregation_type": file_metadata.get(fmts.BucketCustomMetadata.AGGREGATION_TYPE.value,""), # Only CVM's ITR and DFP have aggregation data as stated in fmts.CVMDocumentAggregationType
+        }
 
         def make_opensearch_doc(chunk: PDFChunk, i: int) -> Dict:
 
             base_doc = {
-                "doc_id": bucket_file_path,
+                **file_level_fields,
                 "chunk_id": f"{bucket_file_path}#chunk_{i}",
                 "confidence":  chunk.confidence,
                 "read_method":  chunk.method,
@@ -249,82 +285,56 @@ class OpensearchHandler:
                 "page_start": chunk.page_start,
                 "page_end": chunk.page_end,
                 "tokens": chunk.tokens,
-                "ingestion_ts": file_metadata[fmts.BucketCustomMetadata.INGEST_TS.value],
-                "source": file_metadata[fmts.BucketCustomMetadata.SOURCE.value],
-                "file_hash": file_metadata[fmts.BucketCustomMetadata.FILE_HASH.value],
-                "trace_id": file_metadata[fmts.BucketCustomMetadata.TRACE_ID.value],
-                "document_type": file_metadata[fmts.BucketCustomMetadata.DOCUMENT_TYPE.value],
-                "ref_date": file_metadata[fmts.BucketCustomMetadata.REF_DATE.value],
-                "aggregation_type": file_metadata.get(fmts.BucketCustomMetadata.AGGREGATION_TYPE.value,""), # Only CVM's ITR and DFP have aggregation data as stated in fmts.CVMDocumentAggregationType
                 # embedding to be attached below
             }
             return base_doc
 
-        chunk_iter = iter(chunks)
-        i_global = 0
-        text_batch = []
-        doc_batch = []
+        def generate_actions(chunk_indexes: List[int]) -> Iterable[Dict]:
+            for start in range(0, len(chunk_indexes), self.EMBEDDINGS_BATCH_SIZE):
+                doc_batch = [make_opensearch_doc(chunks[i], i) for i in chunk_indexes[start : start + self.EMBEDDINGS_BATCH_SIZE]]
+                # a single encode call for the whole minibatch amortizes the model's per-call overhead
+                embeddings = self.get_embeddings_multi_qa([d["text"] for d in doc_batch], batch_size=self.EMBEDDINGS_BATCH_SIZE)
+                if self.quantize_embeddings_to_int8:
+                    embeddings = self.quantize_embeddings(embeddings)
+                for d, emb in zip(doc_batch, embeddings):
+                    # the doc is built only for this action (retries rebuild it), so the embedding is attached in place
+                    d["embedding"] = emb
+                    yield {
+                        "_op_type": "index",
+                        "_index": index_name,
+                        "_id": d["chunk_id"],
+                        "_source": d,
+                        "routing": d["doc_id"]
+                    }
+                self.logger.info(f"Processing file '{bucket_file_path}' chunk: {start + len(doc_batch)}/{len(chunk_indexes)}" )
 
         amt_of_chunks = len(chunks)
-        curr_chunk = 0
-        while True:
-            try:
-                chunk = next(chunk_iter)
-                curr_chunk+=1
-                self.logger.info(f"Processing file '{bucket_file_path}' chunk: {curr_chunk}/{amt_of_chunks}" )
-            except StopIteration:
-                # flush any remaining
-                if doc_batch:
-                    # compute embeddings for the last batch if required
-                    # if embedding_fn:
-                    #     embeddings = embedding_fn([d["text"] for d in doc_batch])
-                    # else:
-                    embeddings = [d.get("embedding") for d in doc_batch]
-                    # attach and prepare bulk actions
-                    for j, doc in enumerate(doc_batch):
-                        emb = self.ensure_embedding_list(embeddings[j]) if embeddings else None
-                        doc_body = doc.copy()
-                        if emb is not None:
-                            doc_body["embedding"] = emb
-                        # action meta with routing
-                        action = {
-                            "_op_type": "index",
-                            "_index": index_name,
-                            "_id": doc["chunk_id"],
-                            "_source": doc_body,
-                            "routing": doc["doc_id"]
-                        }
-                        batch.append(action)
-                    flush_batch(batch)
-                break
-
-            # normalization
-            doc = make_opensearch_doc(chunk, i_global)
-            doc_batch.append(doc)
-            text_batch.append(doc["text"])
-            i_global += 1
-
-            # when we have a minibatch for embeddings or reached batch_size for bulk
-            #if len(doc_batch) >= min(batch_size, 200):  # embed in smaller chunks for memory reasons
-            embeddings = self.get_embeddings_multi_qa([d["text"] for d in doc_batch])
-            # attach embeddings and append to bulk payload
-            for j, d in enumerate(doc_batch):
-                emb = self.ensure_embedding_list(embeddings[j]) if embeddings else None
-                d_body = d.copy()
-                if emb is not None:
-                    d_body["embedding"] = emb
-                action = {
-                    "_op_type": "index",
-                    "_index": index_name,
-                    "_id": d["chunk_id"],
-                    "_source": d_body,
-                    "routing": d["doc_id"]
-                }
-                batch.append(action)
-            # flush batch (helpers.bulk expects iterable of actions)
-            flush_batch(batch)
-            doc_batch = []
-            text_batch = []
+        chunk_id_to_idx = {f"{bucket_file_path}#chunk_{i}": i for i in range(amt_of_chunks)}
+        pending_chunk_indexes = list(range(amt_of_chunks))
+        tries = 0
+        while pending_chunk_indexes and tries < max_retries:
+            failed_chunk_indexes = []
+            # the chunks are split across all of the worker threads, so small files don't end up in a single bulk request
+            bulk_chunk_size = max(1, min(self.BULK_CHUNK_SIZE, math.ceil(len(pending_chunk_indexes) / self.BULK_THREAD_COUNT)))
+            # parallel_bulk overlaps the embeddings computation with the bulk requests being sent by its worker threads.
+            # Failed requests are yielded per action (raise_on_exception=False) so that only those chunks are retried
+            for ok, info in helpers.parallel_bulk(self.client,
+                                                  generate_actions(pending_chunk_indexes),
+                                                  thread_count=self.BULK_THREAD_COUNT,
+                                                  chunk_size=bulk_chunk_size,
+                                                  raise_on_error=False,
+                                                  raise_on_exception=False):
+                if ok:
+                    total += 1
+                else:
+                    failed_chunk_indexes.append(chunk_id_to_idx[info["index"]["_id"]])
+
+            pending_chunk_indexes = failed_chunk_indexes
+            if pending_chunk_indexes:
+                tries += 1
+                self.logger.error(f"{len(pending_chunk_indexes)} chunks failed to be indexed (attempt {tries}/{max_retries})")
+                if tries < max_retries:
+                    time.sleep(2 ** tries)
 
         # 4) restore refresh interval and optionally refresh the index
         try:
@@ -337,5 +347,10 @@ class OpensearchHandler:
         except Exception:
             pass
 
+        if pending_chunk_indexes:
+            error_msg = f"{len(pending_chunk_indexes)} of the {amt_of_chunks} chunks of file '{bucket_file_path}' failed to be indexed on OpenSearch's index '{index_name}' after {max_retries} attempts"
+            self.logger.error(error_msg)
+            raise Exception(error_msg)
+
         self.logger.info(f"File '{bucket_file_path}' indexed with success on OpenSearch's index '{index_name}' with '{amt_of_chunks}' chunks")
         return total
@@ -1,10 +1,10 @@
 
 from datetime import datetime
-from typing import List, Dict, Callable, Optional, Any, Iterable, Tuple
-from collections import defaultdict
-from pathlib import Path
+from typing import List, Dict, Callable, Optional, Any, Iterable, Tuple, Union, BinaryIO
+import posixpath
 
 import numpy as np
+import pymupdf
 from ragflow_sdk import RAGFlow
 from ragflow_sdk.modules.dataset import DataSet 
 from ragflow_sdk.modules.document import Document 
@@ -12,21 +12,93 @@ from logging import Logger
 import formats as fmts
 from file_operations import PDFParser
 import os
+import time
+import asyncio
+import httpx
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed, wait
 
 from io import BytesIO
 
+# Bucket custom metadata keys read on every upload
+FILE_HASH_METADATA_KEY = fmts.BucketCustomMetadata.FILE_HASH.value
+SOURCE_METADATA_KEY = fmts.BucketCustomMetadata.SOURCE.value
+DOCUMENT_TYPE_METADATA_KEY = fmts.BucketCustomMetadata.DOCUMENT_TYPE.value
+AGGREGATION_TYPE_METADATA_KEY = fmts.BucketCustomMetadata.AGGREGATION_TYPE.value
+
+def get_upload_blob(file_bytes: Union[bytes, bytearray, BinaryIO]) -> Union[bytes, bytearray, BinaryIO]:
+    """
+    Returns the file content to be sent in an upload request. Bytes payloads are passed as is, while file objects
+    (e.g. BytesIO buffers, temporary files or bucket streams) are rewound and passed for requests to read once, instead of
+    being copied with getvalue() first.
+    """
+    if isinstance(file_bytes, (bytes, bytearray)):
+        return file_bytes
+
+    if file_bytes.seekable():
+        file_bytes.seek(0)
+
+    return file_bytes
+
+def get_unique_display_name(file_name: str, used_names: Iterable[str]) -> str:
+    """
+    Returns the file name to be displayed in the dataset, suffixed as 'name(1).ext', 'name(2).ext'... (as RagFlow does)
+    when it's already used by another file of the same batch, so different files with the same name aren't mixed up.
+    """
+    display_name = file_name
+
+    stem, ext = posixpath.splitext(file_name)
+
+    suffix = 1
+
+    while display_name in used_names:
+
+        display_name = f"{stem}({suffix}){ext}"
+
+        suffix += 1
+
+    return display_name
+
 class RagflowHandler:
     def __init__(self, 
                 logger: Logger,
                 base_url: str,
                 api_key: str,
-                embeddings_model_name : str
+                embeddings_model_name : str,
+                parse_in_background : bool = False
                 ):
         
         self.logger = logger
         self.client = RAGFlow(base_url=base_url,api_key=api_key)
         self.pdf_parser = PDFParser(logger)
         self.embeddings_model_name = embeddings_model_name
+        # Company info added to every uploaded document metadata
+        self.company_name = os.getenv("COMPANY_NAME")
+        self.company_formatted_cnpj = os.getenv("COMPANY_FORMATTED_CNPJ")
+        # Resolved datasets by name, in the format {dataset_name: (DataSet, lookup monotonic time)}
+        self.dataset_cache : Dict[str, Tuple[DataSet, float]] = dict()
+        # Files already in each dataset, in the format {dataset_name: {file_hash: file_name}}
+        self.hash_index_cache : Dict[str, Dict[str, str]] = dict()
+        # Monotonic time of each dataset hash index build, in the format {dataset_name: build time}
+        self.hash_index_build_times : Dict[str, float] = dict()
+        # When enabled, parse requests run in background so the uploads don't wait for them, and wait_pending() must be called
+        # to surface their errors. Otherwise they are sent before the upload returns, raising in the caller
+        self.parse_pool : Optional[ThreadPoolExecutor] = ThreadPoolExecutor(max_workers=self.PARSE_REQUEST_MAX_WORKERS) if parse_in_background else None
+        self.pending_parses : List[Tuple[Future, List[str]]] = list()
+
+    # Seconds a resolved dataset is reused before being looked up again
+    DATASET_CACHE_TTL = 300
+
+    # Seconds a dataset hash index is reused before being rebuilt from the dataset documents
+    HASH_INDEX_CACHE_TTL = 300
+
+    # Documents fetched per list_documents() request when listing a whole dataset
+    LIST_DOCUMENTS_PAGE_SIZE = 1000
+
+    # Max concurrent Document.update() requests when uploading a batch
+    METADATA_UPDATE_MAX_WORKERS = 16
+
+    # Max concurrent DataSet.async_parse_documents() requests
+    PARSE_REQUEST_MAX_WORKERS = 4
 
     NAIVE_PARSER_CONFIG = {"chunk_count":512,
                             "delimiter":"\\n",
@@ -35,6 +107,30 @@ class RagflowHandler:
                             "raptor":{"use_raptor":False}
                         }
 
+    def get_dataset(self, dataset_name: str) -> DataSet:
+        """
+        Returns the dataset with the passed name, reusing the lookups done in the last DATASET_CACHE_TTL seconds.
+        Exceptions raised by the lookup (e.g. the dataset doesn't exist) are propagated.
+        """
+
+        cached = self.dataset_cache.get(dataset_name)
+
+        if cached and time.monotonic() - cached[1] < self.DATASET_CACHE_TTL:
+            return cached[0]
+
+        dataset = self.client.list_datasets(name=dataset_name)[0]
+
+        self.dataset_cache[dataset_name] = (dataset, time.monotonic())
+
+        return dataset
+
+    def invalidate_dataset(self, dataset_name: str):
+        """
+        Removes a dataset from the lookups cache, forcing the next get_dataset() call to fetch it again
+        """
+
+        self.dataset_cache.pop(dataset_name, None)
+
     def get_files_in_dataset(self,
                              file_name:str,
                              dataset_name : str) -> List[Document]:
@@ -51,7 +147,7 @@ class RagflowHandler:
 
         try:
 
-            dataset = self.client.list_datasets(name=dataset_name)[0]
+            dataset = self.get_dataset(dataset_name)
 
         except Exception as e:
             error_msg = f"Dataset with name '{dataset_name}' doesnt exists."
@@ -61,7 +157,7 @@ class RagflowHandler:
         return dataset,dataset.list_documents(keywords=file_name)
 
         
-    def get_all_files_hash_in_dataset(self,dataset : DataSet):
+    def get_all_files_hash_in_dataset(self,dataset : DataSet) -> List[Tuple[str, Optional[str]]]:
         """
         Returns a list of tuples in the format (file_name,file_hash) for all files in a dataset.
 
@@ -69,89 +165,521 @@ class RagflowHandler:
             ragflow_dataset.DataSet : The DataSet object to have its files listed
 
         Return:
-            List[Tuple[str]] : List of tuples in the format (file_name,file_hash) for all files in a dataset
+            List[Tuple[str, Optional[str]]] : List of tuples in the format (file_name,file_hash) for all files in a dataset
         """
 
-        all_files_in_dataset = dataset.list_documents()
+        file_names_and_hashes : List[Tuple[str, Optional[str]]] = list()
+
+        page = 1
+
+        # list_documents() returns only its first page (30 documents by default), so all pages are fetched
+        while True:
 
-        file_names_and_hashes : List[Tuple[str]] = list()
+            curr_page_files = dataset.list_documents(page=page, page_size=self.LIST_DOCUMENTS_PAGE_SIZE)
 
-        for curr_file in all_files_in_dataset:
+            file_names_and_hashes.extend((curr_file.name, getattr(curr_file.meta_fields, "file_hash", None)) for curr_file in curr_page_files)
 
-            file_hash = curr_file.meta_fields.file_hash if hasattr(curr_file.meta_fields,"file_hash") else None
+            if len(curr_page_files) < self.LIST_DOCUMENTS_PAGE_SIZE:
+                break
 
-            file_names_and_hashes.append([curr_file.name,file_hash])
+            page += 1
 
         return file_names_and_hashes
 
+    def get_hash_index(self, dataset_name: str, dataset : DataSet) -> Dict[str, str]:
+        """
+        Returns a dict in the format {file_hash: file_name} for all files in a dataset, 
+        listing the dataset documents only when the dataset has no index built in the last HASH_INDEX_CACHE_TTL seconds.
+
+        Args:
+            dataset_name (str) : Name of the dataset, used as the cache key
+            dataset (ragflow_sdk.modules.dataset.DataSet) : The DataSet object to have its files indexed
+
+        Return:
+            Dict[str, str] : Dict in the format {file_hash: file_name}
+        """
+
+        build_time = self.hash_index_build_times.get(dataset_name)
+
+        if dataset_name not in self.hash_index_cache or build_time is None or time.monotonic() - build_time >= self.HASH_INDEX_CACHE_TTL:
+
+            self.hash_index_cache[dataset_name] = {file_hash: file_name 
+                                                   for file_name, file_hash in self.get_all_files_hash_in_dataset(dataset) 
+                                                   if file_hash is not None}
+
+            self.hash_index_build_times[dataset_name] = time.monotonic()
+
+        return self.hash_index_cache[dataset_name]
+
+    def invalidate_hash_index(self, dataset_name: str):
+        """
+        Removes a dataset hash index from the cache, forcing it to be rebuilt on its next use
+        """
+
+        self.hash_index_cache.pop(dataset_name, None)
+
+        self.hash_index_build_times.pop(dataset_name, None)
+
+    def dedup_check(self, dataset_name: str, file_hash: str) -> Optional[str]:
+        """
+        Checks if a file is already in a dataset by its hash, using the cached dataset and hash index.
+
+        Args:
+            dataset_name (str) : Name of the dataset
+            file_hash (str) : Hash of the file to be checked
+
+        Return:
+            Optional[str] : Name of the dataset file with the same hash, or None if there is none
+        """
+
+        return self.get_hash_index(dataset_name, self.get_dataset(dataset_name)).get(file_hash)
+
+    def mark_uploaded(self, dataset_name: str, file_hash: str, file_name: str):
+        """
+        Adds an uploaded file to the dataset hash index, keeping it fresh without a full rebuild.
+        Does nothing if the dataset has no index yet, since it will list the file when built.
+        """
+
+        if dataset_name in self.hash_index_cache:
+
+            self.hash_index_cache[dataset_name][file_hash] = file_name
+
+    def is_pdf_text_native(self, file_bytes: Union[bytes, bytearray, BinaryIO]) -> bool:
+        """
+        Checks if all pages of a PDF file have an embedded text layer (e.g. digitally generated statements),
+        in which case the expensive layout recognition (OCR) can be skipped on RagFlow's parse.
+        Files that can't be opened as PDFs are treated as not native.
+
+        Args:
+            file_bytes (Union[bytes, bytearray, BinaryIO]) : The file content
+
+        Return:
+            bool : True if every page of the file has text
+        """
+
+        if isinstance(file_bytes, BytesIO):
+            file_stream = file_bytes.getbuffer()
+
+        elif isinstance(file_bytes, (bytes, bytearray, memoryview)):
+            file_stream = file_bytes
+
+        else:
+            file_stream = file_bytes.read()
+
+            if file_bytes.seekable():
+                file_bytes.seek(0)
+
+        try:
+
+            with pymupdf.open(stream=file_stream, filetype="pdf") as pdf:
+
+                return pdf.page_count > 0 and all(page.get_text().strip() for page in pdf)
+
+        except Exception as e:
+            self.logger.warning(f"Could not check if the file text is native, assuming it isn't: {e}")
+
+            return False
+
+    def build_document_meta_fields(self, file_metadata : Dict[str,str], is_pdf_text_native : bool = False) -> Dict[str, Any]:
+        """
+        Builds the RagFlow document update payload (meta fields + parser configs) from the file bucket metadata.
+        Layout recognition is disabled for native text PDFs.
+
+        Args:
+            file_metadata (Dict[str,str]) : The file custom metadata, as saved in the bucket
+            is_pdf_text_native (bool) : If the file text is native, see is_pdf_text_native()
+
+        Return:
+            Dict[str, Any] : The payload to be passed to Document.update()
+        """
+
+        meta_fields = {"empresa" : self.company_name,
+                       "CNPJ" : self.company_formatted_cnpj,
+                       "origem" : file_metadata[SOURCE_METADATA_KEY],
+                       "tipo_documento" : file_metadata[DOCUMENT_TYPE_METADATA_KEY],
+                       "file_hash" : file_metadata[FILE_HASH_METADATA_KEY],
+                       "pdf_is_native" : is_pdf_text_native}
+
+        aggregation_type = file_metadata.get(AGGREGATION_TYPE_METADATA_KEY,None)
+
+        if aggregation_type:
+
+            meta_fields["tipo_agregacao_demonstrativo_financeiro"] = aggregation_type
+
+        return {"meta_fields" : meta_fields,
+                "chunk_method" : "naive",
+                "parser_config" : {**self.NAIVE_PARSER_CONFIG, "layout_recognize" : False} if is_pdf_text_native else self.NAIVE_PARSER_CONFIG}
+
+    def upload_documents_batch(self,
+                               dataset_name: str,
+                               items: List[Tuple[str, Union[bytes, bytearray, BinaryIO], Dict[str,str]]]):
+        """
+        Uploads several files to a dataset in a single request, updates their metadata and requests 
+        the parse of all of them in a single request. Files already in the dataset (same hash) are skipped.
+
+        Args:
+            dataset_name (str) : Name of the dataset to upload the files to
+            items (List[Tuple[str, Union[bytes, bytearray, BinaryIO], Dict[str,str]]]) : List of tuples in the format (file_name, file_bytes, file_metadata)
+        """
+
+        self.logger.info(f"Uploading {len(items)} file(s) to RagFlow's dataset '{dataset_name}'...")
+
+        try:
+
+            dataset = self.get_dataset(dataset_name)
+
+        except Exception as e:
+            self.logger.error("This dataset does not exists, please make sure it exists before uploading. Aborting...")
+
+            exit(1)
+
+        # Files to be uploaded, in the format {file_hash: (display_name, file_bytes, file_metadata)}.
+        # Keyed by hash, so different files with the same name in the batch are all uploaded, and duplicates are skipped
+        files_to_upload : Dict[str, Tuple[str, Union[bytes, bytearray, BinaryIO], Dict[str,str]]] = dict()
+
+        for file_name, file_bytes, file_metadata in items:
+
+            treated_file_name = posixpath.basename(file_name)
+
+            file_to_be_uploaded_hash = file_metadata[FILE_HASH_METADATA_KEY]
+
+            existing_file_name = (files_to_upload[file_to_be_uploaded_hash][0] if file_to_be_uploaded_hash in files_to_upload
+                                  else self.dedup_check(dataset_name, file_to_be_uploaded_hash))
+
+            if existing_file_name:
+
+                self.logger.warning(f"The file to be uploaded '{treated_file_name}' already exists in dataset '{dataset_name}' as '{existing_file_name}'")
+
+                continue
+
+            display_name = get_unique_display_name(treated_file_name, {name for name, _, _ in files_to_upload.values()})
+
+            files_to_upload[file_to_be_uploaded_hash] = (display_name, file_bytes, file_metadata)
+
+        if not files_to_upload:
+
+            return
+
+        try:
+
+            # The created documents are returned in the same order of the uploaded files
+            uploaded_docs : List[Document] = dataset.upload_documents([{"display_name": display_name, "blob": get_upload_blob(file_bytes)}
+                                                                       for display_name, file_bytes, _ in files_to_upload.values()])
+
+        except Exception:
+            # The dataset may be partially updated, so the index is rebuilt on the next upload
+            self.invalidate_hash_index(dataset_name)
+            raise
+
+        # Only the files confirmed by a returned document are indexed, under the name RagFlow saved them with
+        confirmed_files = list(zip(files_to_upload.items(), uploaded_docs))
+
+        for (file_hash, _), doc in confirmed_files:
+
+            self.mark_uploaded(dataset_name, file_hash, doc.name)
+
+        if len(confirmed_files) < len(files_to_upload):
+
+            self.logger.error(f"RagFlow returned {len(uploaded_docs)} document(s) for {len(files_to_upload)} uploaded file(s), the hash index will be rebuilt")
+
+            self.invalidate_hash_index(dataset_name)
+
+        self.logger.info(f"{len(confirmed_files)} file(s) uploaded with success")
+
+        self.logger.info("Checking if PDF files text is native...")
+
+        documents_meta_fields = [self.build_document_meta_fields(file_metadata, self.is_pdf_text_native(file_bytes))
+                                 for (_, (_, file_bytes, file_metadata)), _ in confirmed_files]
+
+        failed_docs_ids : List[str] = list()
+
+        failed_docs_names : List[str] = list()
+
+        # The updates are independent HTTP requests, so a failed one doesn't stop the others
+        with ThreadPoolExecutor(max_workers=min(self.METADATA_UPDATE_MAX_WORKERS, len(uploaded_docs) or 1)) as executor:
+
+            futures = {executor.submit(doc.update, document_meta_fields): doc 
+                       for doc, document_meta_fields in zip(uploaded_docs, documents_meta_fields)}
+
+            for future in as_completed(futures):
+
+                doc = futures[future]
+
+                try:
+
+                    future.result()
+
+                except Exception as e:
+                    self.logger.error(f"Failed to upload the metadata of file '{doc.name}': {e}")
+
+                    failed_docs_ids.append(doc.id)
+
+                    failed_docs_names.append(doc.name)
+
+        updated_docs = [doc for doc in uploaded_docs if doc.id not in failed_docs_ids]
+
+        self.logger.info(f"{len(updated_docs)} file(s) metadata uploaded with success")
+
+        if updated_docs and self.parse_pool:
+
+            self.logger.info("Requesting files parse (file reading + embedding) in background")
+
+            updated_docs_names = [doc.name for doc in updated_docs]
+
+            self.pending_parses.append((self.parse_pool.submit(dataset.async_parse_documents, [doc.id for doc in updated_docs]), 
+                                        updated_docs_names))
+
+        elif updated_docs:
+
+            self.logger.info("Requesting files parse (file reading + embedding)")
+
+            dataset.async_parse_documents([doc.id for doc in updated_docs])
+
+            self.logger.info("Files parse requested with success")
+
+        if failed_docs_names:
+            error_msg = f"Failed to upload the metadata of file(s) {failed_docs_names} to dataset '{dataset_name}', their parse was not requested"
+            self.logger.error(error_msg)
+            raise Exception(error_msg)
+
     def upload_document_and_start_parse(self,
                                         dataset_name: str,
                                         file_name: str,
-                                        file_bytes: BytesIO,
+                                        file_bytes: Union[bytes, bytearray, BinaryIO],
                                         file_metadata : Dict[str,str]):
-        
-        treated_file_name = Path(file_name).name
 
-        self.logger.info(f"Uploading file '{treated_file_name}' to RagFlow's dataset '{dataset_name}'...")
+        self.upload_documents_batch(dataset_name, [(file_name, file_bytes, file_metadata)])
+
+    def wait_pending(self):
+        """
+        Waits for the parse requests submitted in background by handlers created with parse_in_background=True,
+        raising an exception if any of them failed. Must be called before the process exits, so no requested parse is lost.
+        """
+
+        pending_parses, self.pending_parses = self.pending_parses, list()
+
+        wait([future for future, _ in pending_parses])
+
+        failed_docs_names : List[str] = list()
+
+        for future, docs_names in pending_parses:
+
+            if future.exception():
+
+                self.logger.error(f"Failed to request the parse of file(s) {docs_names}: {future.exception()}")
+
+                failed_docs_names.extend(docs_names)
+
+        if failed_docs_names:
+            error_msg = f"Failed to request the parse of file(s) {failed_docs_names}"
+            self.logger.error(error_msg)
+            raise Exception(error_msg)
+
+        self.logger.info(f"{len(pending_parses)} parse request(s) done with success")
+
+
+class AsyncRagflowHandler(RagflowHandler):
+    """
+    RagflowHandler version that uploads files concurrently through an async HTTP/2 client, instead of the SDK's synchronous requests calls.
+    The per file requests (upload, metadata update) and the parse request go through httpx, while the dataset and
+    hash index lookups reuse the cached RagflowHandler ones, run in a worker thread.
+    """
+    def __init__(self, 
+                logger: Logger,
+                base_url: str,
+                api_key: str,
+                embeddings_model_name : str
+                ):
+
+        super().__init__(logger, base_url, api_key, embeddings_model_name)
+
+        self.http_client = httpx.AsyncClient(base_url=f"{base_url}/api/v1",
+                                             headers={"Authorization": f"Bearer {api_key}"},
+                                             http2=True,
+                                             limits=httpx.Limits(max_keepalive_connections=self.HTTP_MAX_KEEPALIVE_CONNECTIONS),
+                                             timeout=self.HTTP_TIMEOUT)
+
+    # Connections kept alive to the RagFlow host
+    HTTP_MAX_KEEPALIVE_CONNECTIONS = 32
+
+    # Seconds to wait for each RagFlow response, uploads of big files included
+    HTTP_TIMEOUT = 300
+
+    # Max files being uploaded at the same time
+    UPLOAD_MAX_CONCURRENCY = 16
+
+    async def request(self, method: str, path: str, **kwargs) -> Any:
+        """
+        Sends a request to the RagFlow API, returning the response 'data' field.
+        Raises an exception if the response status or RagFlow 'code' field is an error
+        """
+
+        response = await self.http_client.request(method, path, **kwargs)
+
+        response.raise_for_status()
+
+        response_json = response.json()
+
+        if response_json.get("code") != 0:
+            error_msg = f"RagFlow request '{method} {path}' failed: {response_json.get('message')}"
+            self.logger.error(error_msg)
+            raise Exception(error_msg)
+
+        return response_json.get("data")
+
+    async def upload_document(self,
+                              dataset_id: str,
+                              file_name: str,
+                              file_bytes: Union[bytes, bytearray, BinaryIO],
+                              file_metadata : Dict[str,str],
+                              semaphore : asyncio.Semaphore) -> Tuple[str, str]:
+        """
+        Uploads a file to a dataset and updates its metadata, returning the uploaded document id and name.
+
+        Args:
+            dataset_id (str) : Id of the dataset to upload the file to
+            file_name (str) : Name of the file in the dataset
+            file_bytes (Union[bytes, bytearray, BinaryIO]) : The file content. Seekable file objects are streamed by httpx instead of being copied
+            file_metadata (Dict[str,str]) : The file custom metadata, as saved in the bucket
+            semaphore (asyncio.Semaphore) : Limits the concurrent uploads
+
+        Return:
+            Tuple[str, str] : The uploaded document id and the name RagFlow saved it with
+        """
+
+        # httpx only takes bytes or file objects as multipart content
+        if isinstance(file_bytes, bytearray):
+            file_bytes = bytes(file_bytes)
+
+        # The native text check reads the file first, and non seekable streams can't be rewound for the upload afterwards, so they are read once here
+        elif not isinstance(file_bytes, bytes) and not file_bytes.seekable():
+            file_bytes = file_bytes.read()
+
+        document_meta_fields = self.build_document_meta_fields(file_metadata, await asyncio.to_thread(self.is_pdf_text_native, file_bytes))
+
+        async with semaphore:
+
+            uploaded_docs = await self.request("POST", f"/datasets/{dataset_id}/documents", files=[("file", (file_name, file_bytes))])
+
+            doc_id, doc_name = uploaded_docs[0]["id"], uploaded_docs[0]["name"]
+
+            await self.request("PUT", f"/datasets/{dataset_id}/documents/{doc_id}", json=document_meta_fields)
+
+        return doc_id, doc_name
+
+    async def upload_documents_batch(self,
+                                     dataset_name: str,
+                                     items: List[Tuple[str, Union[bytes, bytearray, BinaryIO], Dict[str,str]]]):
+        """
+        Async version of RagflowHandler.upload_documents_batch: uploads the files (with their metadata) concurrently,
+        up to UPLOAD_MAX_CONCURRENCY at a time, and requests the parse of all of them in a single request.
+        A failed upload doesn't stop the others, being raised at the end.
+
+        Args:
+            dataset_name (str) : Name of the dataset to upload the files to
+            items (List[Tuple[str, Union[bytes, bytearray, BinaryIO], Dict[str,str]]]) : List of tuples in the format (file_name, file_bytes, file_metadata)
+        """
+
+        self.logger.info(f"Uploading {len(items)} file(s) to RagFlow's dataset '{dataset_name}'...")
 
         try:
 
-            dataset = self.client.list_datasets(name=dataset_name)[0]
+            dataset = await asyncio.to_thread(self.get_dataset, dataset_name)
 
         except Exception as e:
             self.logger.error("This dataset does not exists, please make sure it exists before uploading. Aborting...")
 
             exit(1)
 
-        file_to_be_uploaded_hash = file_metadata[fmts.BucketCustomMetadata.FILE_HASH.value]
+        existing_files_hashes = await asyncio.to_thread(self.get_hash_index, dataset_name, dataset)
 
-        for dataset_file_name,dataset_file_hash in self.get_all_files_hash_in_dataset(dataset):
+        # Files to be uploaded, in the format {file_hash: (display_name, file_bytes, file_metadata)}.
+        # Keyed by hash, so different files with the same name in the batch are all uploaded, and duplicates are skipped
+        files_to_upload : Dict[str, Tuple[str, Union[bytes, bytearray, BinaryIO], Dict[str,str]]] = dict()
 
-            if file_to_be_uploaded_hash == dataset_file_hash:
+        for file_name, file_bytes, file_metadata in items:
 
-                self.logger.warning(f"The file to be uploaded '{treated_file_name}' already exists in dataset '{dataset_name}' as '{dataset_file_name}'")
+            treated_file_name = posixpath.basename(file_name)
 
-                return
-            
-        dataset.upload_documents([{"display_name": treated_file_name, "blob": file_bytes.getvalue()}])
+            file_to_be_uploaded_hash = file_metadata[FILE_HASH_METADATA_KEY]
 
-        self.logger.info("File uploaded with success")
+            existing_file_name = (files_to_upload[file_to_be_uploaded_hash][0] if file_to_be_uploaded_hash in files_to_upload
+                                  else existing_files_hashes.get(file_to_be_uploaded_hash))
 
-        self.logger.info("Checking if PDF file text is native...")
+            if existing_file_name:
 
-        document_meta_fields = defaultdict(dict)
+                self.logger.warning(f"The file to be uploaded '{treated_file_name}' already exists in dataset '{dataset_name}' as '{existing_file_name}'")
 
-        document_meta_fields["meta_fields"]["empresa"] = os.getenv("COMPANY_NAME")
+                continue
 
-        document_meta_fields["meta_fields"]["CNPJ"] = os.getenv("COMPANY_FORMATTED_CNPJ")
+            display_name = get_unique_display_name(treated_file_name, {name for name, _, _ in files_to_upload.values()})
 
-        document_meta_fields["meta_fields"]["origem"] = file_metadata[fmts.BucketCustomMetadata.SOURCE.value]
+            files_to_upload[file_to_be_uploaded_hash] = (display_name, file_bytes, file_metadata)
 
-        document_meta_fields["meta_fields"]["tipo_documento"] = file_metadata[fmts.BucketCustomMetadata.DOCUMENT_TYPE.value]
+        if not files_to_upload:
 
-        document_meta_fields["meta_fields"]["file_hash"] = file_metadata[fmts.BucketCustomMetadata.FILE_HASH.value]
+            return
 
-        aggregation_type = file_metadata.get(fmts.BucketCustomMetadata.AGGREGATION_TYPE.value,None)
+        semaphore = asyncio.Semaphore(self.UPLOAD_MAX_CONCURRENCY)
 
-        if aggregation_type:
+        results = await asyncio.gather(*[self.upload_document(dataset.id, display_name, file_bytes, file_metadata, semaphore)
+                                         for display_name, file_bytes, file_metadata in files_to_upload.values()],
+                                       return_exceptions=True)
 
-            document_meta_fields["meta_fields"]["tipo_agregacao_demonstrativo_financeiro"] = aggregation_type
+        uploaded_docs_ids : List[str] = list()
 
-        document_meta_fields["chunk_method"] = "naive"
+        failed_docs_names : List[str] = list()
 
-        document_meta_fields["parser_config"] = self.NAIVE_PARSER_CONFIG
+        for (file_hash, (display_name, _, _)), result in zip(files_to_upload.items(), results):
 
-        doc = dataset.list_documents(name=treated_file_name)[0]
+            if isinstance(result, BaseException):
 
-        doc.update(dict(document_meta_fields))
+                self.logger.error(f"Failed to upload file '{display_name}': {result}")
 
-        self.logger.info("File metadata uploaded with success")
+                failed_docs_names.append(display_name)
 
-        self.logger.info("Requesting file parse (file reading + embedding)")
+                continue
 
-        dataset.async_parse_documents([doc.id])
+            doc_id, doc_name = result
 
-        self.logger.info("File parse requested with success")
-        
+            # Indexed under the name RagFlow saved the file with, as the sync handler does
+            self.mark_uploaded(dataset_name, file_hash, doc_name)
+
+            uploaded_docs_ids.append(doc_id)
+
+        if failed_docs_names:
+            # A failed file may have been uploaded without its metadata, so the index is rebuilt on the next upload
+            self.invalidate_hash_index(dataset_name)
 
+        self.logger.info(f"{len(uploaded_docs_ids)} file(s) uploaded with success")
+
+        if uploaded_docs_ids:
+
+            self.logger.info("Requesting files parse (file reading + embedding)")
+
+            await self.request("POST", f"/datasets/{dataset.id}/chunks", json={"document_ids": uploaded_docs_ids})
+
+            self.logger.info("Files parse requested with success")
+
+        if failed_docs_names:
+            error_msg = f"Failed to upload file(s) {failed_docs_names} to dataset '{dataset_name}', their parse was not requested"
+            self.logger.error(error_msg)
+            raise Exception(error_msg)
+
+    async def upload_document_and_start_parse(self,
+                                              dataset_name: str,
+                                              file_name: str,
+                                              file_bytes: Union[bytes, bytearray, BinaryIO],
+                                              file_metadata : Dict[str,str]):
+        """
+        Async version of RagflowHandler.upload_document_and_start_parse, so single file callers await the upload
+        """
+
+        await self.upload_documents_batch(dataset_name, [(file_name, file_bytes, file_metadata)])
+
+    async def aclose(self):
+        """
+        Closes the async HTTP client connections
+        """
 
+        await self.http_client.aclose()
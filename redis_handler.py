@@ -1,15 +1,86 @@
 import redis
+import redis.asyncio
+import asyncio
 import formats as fmts
 from datetime import datetime, date
 from logging import Logger
-import json
+from typing import List, Tuple, Optional
+from functools import lru_cache
+from io import BytesIO
+import pandas as pd
+import pyarrow as pa
+import orjson
+import zstandard
+import hashlib
+import weakref
 
 
-class DateTimeEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, (date, datetime)):
-            return obj.isoformat()
-        return super().default(obj)
+def serialize_json_default(obj):
+    """
+    Fallback for the types orjson doesn't serialize natively, such as pandas.Timestamp (a datetime subclass)
+    """
+    if isinstance(obj, (date, datetime)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def get_pool_key(host: str, port: int, password: Optional[str], db: int, *settings) -> Tuple:
+    """
+    Returns the key of a shared connection pool. Handlers connecting with other credentials or to another database
+    must not get the same pool, and the password is hashed so it isn't kept in plain text in the key
+    """
+    password_hash = hashlib.sha256(password.encode()).hexdigest() if password else None
+    return (host, port, password_hash, db, *settings)
+
+
+@lru_cache(maxsize=None)
+def get_gold_serving_bucket_path(gold_table_value: str, agg_type_value: Optional[str] = None) -> str:
+    """
+    Returns the gold serving bucket path of a table, cached as the same few tables are saved over and over
+    """
+    agg_type = f"_{agg_type_value}_" if agg_type_value else ""
+    return f"gold/serving/{gold_table_value}{agg_type}.parquet"
+
+
+# orjson options of the JSON payloads. Non string keys (e.g. numeric columns) are stringified as json.dumps does
+JSON_DUMPS_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+# JSON payloads bigger than this (in bytes) are stored zstd compressed
+COMPRESSION_MIN_PAYLOAD_SIZE = 64 * 1024
+ZSTD_COMPRESSION_LEVEL = 3
+# Every zstd frame starts with these bytes, which can't start a JSON document, so compressed payloads are told apart from plain ones
+ZSTD_FRAME_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def build_cache_payload(gold_table  : fmts.GoldServingTableNames,
+                        data_dict   : dict,
+                        ref_date    : datetime,
+                        trace_id    : str,
+                        agg_type    : fmts.CVMDocumentAggregationType = None,
+                        data_orient : str = "records") -> bytes:
+    """
+    Function responsible for building the JSON payload stored for a gold layer table, enforcing the required fields.
+    Payloads bigger than COMPRESSION_MIN_PAYLOAD_SIZE are zstd compressed, see RedisHandler.get_from_cache.
+    'data_orient' follows pandas' to_dict orient naming ("records" or "list", the column-oriented {column: [values]} form) and is stored alongside the data for the consumers.
+    Shared by RedisHandler and AsyncRedisHandler, so both store the same payloads.
+
+    """
+
+    save_dict = {
+                "data" : data_dict,
+                "data_orient" : data_orient,
+                "file_bucket_path" : get_gold_serving_bucket_path(gold_table.value, agg_type.value if agg_type else None),
+                "ref_data" : fmts.create_ref_date(ref_date),
+                "trace_id" : trace_id
+            }
+
+    payload = orjson.dumps(save_dict, default=serialize_json_default, option=JSON_DUMPS_OPTIONS)
+
+    if len(payload) > COMPRESSION_MIN_PAYLOAD_SIZE:
+        # Module level compress() is thread safe, unlike a shared ZstdCompressor
+        return zstandard.compress(payload, ZSTD_COMPRESSION_LEVEL)
+
+    return payload
 
 
 class RedisHandler():
@@ -20,44 +91,336 @@ class RedisHandler():
                  logger: Logger,
                  host: str,
                  port: int,
-                 password: str):
+                 password: str,
+                 db: int = 0,
+                 cache_dfs_as_arrow_ipc: bool = False):
 
-        self.client = redis.Redis(host=host, port=port, password=password, decode_responses=True)
+        self.client = redis.Redis(connection_pool=self.get_pool(host, port, password, decode_responses=True, db=db))
+        # Binary payloads (e.g. parquet bytes) can't go through the decoding client above
+        self.bytes_client = redis.Redis(connection_pool=self.get_pool(host, port, password, decode_responses=False, db=db))
         self.logger = logger
+        # Format of the dataframes saved by save_df_to_cache. The JSON payloads are the ones get_from_cache consumers read,
+        # while Arrow IPC streams are only readable through get_df_from_cache (see save_df_to_cache)
+        self.cache_dfs_as_arrow_ipc = cache_dfs_as_arrow_ipc
+
+    # Connection pools shared by all handlers, in the format {(host, port, password_hash, db, decode_responses): ConnectionPool}
+    CONNECTION_POOLS = dict()
+
+    @classmethod
+    def get_pool(cls,
+                 host: str,
+                 port: int,
+                 password: str,
+                 decode_responses: bool,
+                 db: int = 0) -> redis.ConnectionPool:
+        """
+        Returns the connection pool shared by the handlers of a Redis server, creating it on the first call.
+        Reusing the pool avoids a new TCP connection + AUTH for every handler instance.
+        The responses decoding is a connection setting, so decoding and binary clients get different pools.
+
+        """
+
+        pool_key = get_pool_key(host, port, password, db, decode_responses)
+
+        if pool_key not in cls.CONNECTION_POOLS:
+
+            cls.CONNECTION_POOLS[pool_key] = redis.ConnectionPool(host=host,
+                                                                  port=port,
+                                                                  password=password,
+                                                                  db=db,
+                                                                  decode_responses=decode_responses,
+                                                                  socket_keepalive=True)
+
+        return cls.CONNECTION_POOLS[pool_key]
+
+    # Suffix used for the keys holding binary payloads, so they don't clash with the JSON ones
+    BYTES_CACHE_KEY_SUFFIX = ":bytes"
+
+    # Serialization formats accepted by save_bytes_to_cache
+    PARQUET_DATA_FORMAT   = "parquet"
+    ARROW_IPC_DATA_FORMAT = "arrow_ipc"
 
     def save_to_cache(self,
                       gold_table  : fmts.GoldServingTableNames,
                       data_dict   : dict,
                       ref_date    : datetime,
                       trace_id    : str,
-                      agg_type    : fmts.CVMDocumentAggregationType = None):
+                      agg_type    : fmts.CVMDocumentAggregationType = None,
+                      data_orient : str = "records"):
         """
         Function responsible for storing data into the redis cache, enforcing the required fields.
+        See build_cache_payload for the stored fields.
 
         """
         
-        self.logger.info(f"Saving data into Redis cache for gold layer table '{gold_table.value}' with reference date '{ref_date}' and trace id '{trace_id}'")
+        self.save_many_to_cache([(gold_table, data_dict, ref_date, trace_id, agg_type, data_orient)])
+
+    def save_many_to_cache(self,
+                           entries : List[Tuple]):
+        """
+        Function responsible for storing several tables into the redis cache in a single round trip through one MSET command.
+        The cache entries have no TTL, so MSET keeps the same semantics as one SET per table (the last entry of a repeated table wins).
+        The tables' '<gold_table><BYTES_CACHE_KEY_SUFFIX>' entries are removed in the same transaction, so get_df_from_cache doesn't serve stale data.
+
+        Args:
+            entries (List[Tuple]) : Tuples with save_to_cache arguments, in the format (gold_table, data_dict, ref_date, trace_id[, agg_type[, data_orient]])
+
+        """
+
+        if not entries:
+            return
+
+        payloads = dict()
+
+        for entry in entries:
+
+            gold_table, ref_date, trace_id = entry[0], entry[2], entry[3]
+
+            self.logger.info(f"Saving data into Redis cache for gold layer table '{gold_table.value}' with reference date '{ref_date}' and trace id '{trace_id}'")
+
+            payloads[gold_table.value] = build_cache_payload(*entry)
+
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.mset(payloads)
+            pipe.delete(*[f"{table_key}{self.BYTES_CACHE_KEY_SUFFIX}" for table_key in payloads])
+            pipe.execute()
         
-        agg_type = f"_{agg_type.value}_" if agg_type else ""
+        self.logger.info("Data saved into Redis cache with success")
+
+    def save_bytes_to_cache(self,
+                            gold_table  : fmts.GoldServingTableNames,
+                            data_bytes  : bytes,
+                            ref_date    : datetime,
+                            trace_id    : str,
+                            agg_type    : fmts.CVMDocumentAggregationType = None,
+                            data_format : str = PARQUET_DATA_FORMAT):
+        """
+        Function responsible for storing an already serialized table (parquet or Arrow IPC stream bytes) into the redis cache, enforcing the required fields.
+        The payload is stored as a hash at '<gold_table><BYTES_CACHE_KEY_SUFFIX>' and the table's JSON entry is removed so stale data isn't served.
+
+        """
+
+        self.logger.info(f"Saving bytes data into Redis cache for gold layer table '{gold_table.value}' with reference date '{ref_date}' and trace id '{trace_id}'")
 
         save_dict = {
-                    "data" : data_dict,
-                    "file_bucket_path" : f"gold/serving/{gold_table.value}{agg_type}.parquet",
+                    "data" : data_bytes,
+                    "data_format" : data_format,
+                    "file_bucket_path" : get_gold_serving_bucket_path(gold_table.value, agg_type.value if agg_type else None),
                     "ref_data" : fmts.create_ref_date(ref_date),
                     "trace_id" : trace_id
                 }
-        
-        self.client.set(
-                            gold_table.value,
-                            json.dumps(save_dict,cls=DateTimeEncoder)
-                        )
-        
+
+        with self.bytes_client.pipeline(transaction=True) as pipe:
+            pipe.delete(gold_table.value)
+            pipe.delete(f"{gold_table.value}{self.BYTES_CACHE_KEY_SUFFIX}")
+            pipe.hset(f"{gold_table.value}{self.BYTES_CACHE_KEY_SUFFIX}", mapping=save_dict)
+            pipe.execute()
+
+        self.logger.info("Bytes data saved into Redis cache with success")
+
+    def save_df_to_cache(self,
+                         gold_table  : fmts.GoldServingTableNames,
+                         df          : pd.DataFrame,
+                         ref_date    : datetime,
+                         trace_id    : str,
+                         agg_type    : fmts.CVMDocumentAggregationType = None):
+        """
+        Function responsible for storing a dataframe into the redis cache. It can be read back with get_df_from_cache.
+        By default the dataframe is stored as a column-oriented JSON payload (data_orient "list") at the table key, readable through get_from_cache.
+        Handlers created with cache_dfs_as_arrow_ipc=True store it as an Arrow IPC stream at '<gold_table><BYTES_CACHE_KEY_SUFFIX>' instead,
+        avoiding its conversion to python objects, but get_from_cache consumers no longer find the table.
+        Either way the entry in the other format is removed, so stale data isn't served.
+
+        """
+
+        if self.cache_dfs_as_arrow_ipc:
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+
+            self.save_bytes_to_cache(gold_table,
+                                     sink.getvalue().to_pybytes(),
+                                     ref_date,
+                                     trace_id,
+                                     agg_type,
+                                     data_format=self.ARROW_IPC_DATA_FORMAT)
+
+            return
+
+        self.logger.info(f"Saving data into Redis cache for gold layer table '{gold_table.value}' with reference date '{ref_date}' and trace id '{trace_id}'")
+
+        # Converting each column at once avoids the per-cell boxing done by to_dict(orient="records")
+        payload = build_cache_payload(gold_table, {col: df[col].tolist() for col in df.columns}, ref_date, trace_id, agg_type, data_orient="list")
+
+        with self.bytes_client.pipeline(transaction=True) as pipe:
+            pipe.set(gold_table.value, payload)
+            pipe.delete(f"{gold_table.value}{self.BYTES_CACHE_KEY_SUFFIX}")
+            pipe.execute()
+
         self.logger.info("Data saved into Redis cache with success")
 
     def get_from_cache(self,
                        gold_table : fmts.GoldServingTableNames):
         """
-        Function to retrieve a given file from the redis cache
+        Function to retrieve a given file from the redis cache, decompressing it if it was stored compressed
         """
         
-        return self.client.get(gold_table.value)
\ No newline at end of file
+        payload = self.bytes_client.get(gold_table.value)
+
+        if payload is None:
+            return None
+
+        if payload.startswith(ZSTD_FRAME_MAGIC):
+            payload = zstandard.decompress(payload)
+
+        return payload.decode()
+
+    def get_bytes_from_cache(self,
+                             gold_table : fmts.GoldServingTableNames) -> dict:
+        """
+        Function to retrieve a given file saved through save_bytes_to_cache from the redis cache.
+        The 'data' field is kept as bytes while the remaining fields are decoded to str
+        """
+
+        cached = self.bytes_client.hgetall(f"{gold_table.value}{self.BYTES_CACHE_KEY_SUFFIX}")
+
+        return {key.decode(): (value if key == b"data" else value.decode()) for key, value in cached.items()}
+
+    def get_df_from_cache(self,
+                          gold_table : fmts.GoldServingTableNames) -> pd.DataFrame:
+        """
+        Function to retrieve a given table saved through save_bytes_to_cache, save_df_to_cache or save_to_cache from the redis cache as a dataframe.
+        Returns None if the table isn't cached
+        """
+
+        cached = self.get_bytes_from_cache(gold_table)
+
+        if not cached:
+
+            payload = self.get_from_cache(gold_table)
+
+            # Both the "records" and "list" orients are accepted by the DataFrame constructor
+            return pd.DataFrame(orjson.loads(payload)["data"]) if payload else None
+
+        if cached.get("data_format") == self.ARROW_IPC_DATA_FORMAT:
+            return pa.ipc.open_stream(cached["data"]).read_all().to_pandas()
+
+        return pd.read_parquet(BytesIO(cached["data"]))
+
+
+class AsyncRedisHandler():
+    """
+    Class responsible for handling cache write operations with Redis from async code.
+    The JSON payloads are built in a worker thread, so big tables don't stall the event loop while being serialized.
+    The stored payloads are the same ones written by RedisHandler
+    """
+    def __init__(self,
+                 logger: Logger,
+                 host: str,
+                 port: int,
+                 password: str,
+                 db: int = 0):
+
+        self.host = host
+        self.port = port
+        self.password = password
+        self.db = db
+        self.logger = logger
+
+    # Connection pools shared by the async handlers of each event loop, in the format {loop: {(host, port, password_hash, db): ConnectionPool}}.
+    # Async connections belong to the event loop they were opened in, so each loop gets its own pools, dropped along with the loop
+    CONNECTION_POOLS = weakref.WeakKeyDictionary()
+    # Clients of the pools above, in the same format, so the handlers of a loop reuse one client per pool instead of creating one per call
+    CLIENTS = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def get_pool(cls,
+                 host: str,
+                 port: int,
+                 password: str,
+                 db: int = 0) -> redis.asyncio.ConnectionPool:
+        """
+        Returns the async connection pool shared by the handlers of a Redis server in the running event loop, creating it on the first call.
+        Must be called from a coroutine.
+
+        """
+
+        loop_pools = cls.CONNECTION_POOLS.setdefault(asyncio.get_running_loop(), dict())
+
+        pool_key = get_pool_key(host, port, password, db)
+
+        if pool_key not in loop_pools:
+
+            loop_pools[pool_key] = redis.asyncio.ConnectionPool(host=host,
+                                                                port=port,
+                                                                password=password,
+                                                                db=db,
+                                                                decode_responses=True,
+                                                                socket_keepalive=True)
+
+        return loop_pools[pool_key]
+
+    def get_client(self) -> redis.asyncio.Redis:
+        """
+        Returns the client of the running event loop connection pool, creating it on the first call. Must be called from a coroutine.
+
+        """
+
+        loop_clients = self.CLIENTS.setdefault(asyncio.get_running_loop(), dict())
+
+        pool_key = get_pool_key(self.host, self.port, self.password, self.db)
+
+        if pool_key not in loop_clients:
+
+            loop_clients[pool_key] = redis.asyncio.Redis(connection_pool=self.get_pool(self.host, self.port, self.password, self.db))
+
+        return loop_clients[pool_key]
+
+    async def save_to_cache(self,
+                            gold_table  : fmts.GoldServingTableNames,
+                            data_dict   : dict,
+                            ref_date    : datetime,
+                            trace_id    : str,
+                            agg_type    : fmts.CVMDocumentAggregationType = None,
+                            data_orient : str = "records"):
+        """
+        Async version of RedisHandler.save_to_cache.
+        See build_cache_payload for the stored fields.
+
+        """
+
+        await self.save_many_to_cache([(gold_table, data_dict, ref_date, trace_id, agg_type, data_orient)])
+
+    async def save_many_to_cache(self,
+                                 entries : List[Tuple]):
+        """
+        Async version of RedisHandler.save_many_to_cache, storing several tables in a single MSET command
+        and removing their binary entries in the same transaction.
+
+        Args:
+            entries (List[Tuple]) : Tuples with save_to_cache arguments, in the format (gold_table, data_dict, ref_date, trace_id[, agg_type[, data_orient]])
+
+        """
+
+        if not entries:
+            return
+
+        payloads = dict()
+
+        for entry in entries:
+
+            gold_table, ref_date, trace_id = entry[0], entry[2], entry[3]
+
+            self.logger.info(f"Saving data into Redis cache for gold layer table '{gold_table.value}' with reference date '{ref_date}' and trace id '{trace_id}'")
+
+            payloads[gold_table.value] = await asyncio.to_thread(build_cache_payload, *entry)
+
+        async with self.get_client().pipeline(transaction=True) as pipe:
+            pipe.mset(payloads)
+            pipe.delete(*[f"{table_key}{RedisHandler.BYTES_CACHE_KEY_SUFFIX}" for table_key in payloads])
+            await pipe.execute()
+        
+        self.logger.info("Data saved into Redis cache with success")
@@ -441,5 +441,5 @@ class TestIntegrationScenarios:
 
 
 # Run with: pytest test_b3_etl.py -v
-# Debug specific test: pytest test_b3_etl.py::TestMacroDataFullETL::test_macro_data_full_etl_success -v --pdb
+# Debug specific test: pytest test_b3_etl.py::TestMacroDataFullETL::test_macro_data_full_etl_success -v -n0 --pdb
 # Run with coverage: pytest test_b3_etl.py --cov=etls.b3_etl --cov-report=html
\ No newline at end of file
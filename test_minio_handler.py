@@ -0,0 +1,163 @@
+import pytest
+from io import BytesIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from minio.error import S3Error
+
+from minio_handler import MinioHandler
+from formats import BucketCustomMetadata
+
+
+FOLDER = Path("bronze/raw/cvm")
+
+
+def no_such_key() -> S3Error:
+    """Create the error raised by MinIO for missing objects."""
+    return S3Error(response=None, code="NoSuchKey", message="Object does not exist", resource=None, request_id=None, host_id=None)
+
+
+@pytest.fixture
+def bucket():
+    """
+    In-memory bucket objects, in the format {object_name: content}. Files custom metadata are kept in 'metadata',
+    in the format {object_name: {file_hash_key: file_hash}}.
+    """
+    return SimpleNamespace(objects=dict(), metadata=dict())
+
+
+@pytest.fixture
+def minio_handler(bucket):
+    """Create MinioHandler instance whose MinIO client reads and writes the in-memory bucket."""
+    with patch('minio_handler.Minio') as mock_minio_class:
+        client = mock_minio_class.return_value
+        client.bucket_exists.return_value = True
+
+        handler = MinioHandler(Mock(), "test-bucket", "localhost", "9000", "user", "password")
+
+    def stat_object(bucket_name, object_name):
+        if object_name not in bucket.objects:
+            raise no_such_key()
+        return SimpleNamespace(metadata=bucket.metadata.get(object_name, dict()))
+
+    def get_object(bucket_name, object_name):
+        if object_name not in bucket.objects:
+            raise no_such_key()
+        return Mock(read=Mock(return_value=bucket.objects[object_name]))
+
+    def put_object(bucket_name, object_name, data, length, content_type, metadata=None):
+        bucket.objects[object_name] = data.read()
+        if metadata:
+            bucket.metadata[object_name] = metadata
+
+    def list_objects(bucket_name, prefix, recursive):
+        return [SimpleNamespace(object_name=name) for name in list(bucket.objects) if name.startswith(prefix)]
+
+    client.stat_object.side_effect = stat_object
+    client.get_object.side_effect = get_object
+    client.put_object.side_effect = put_object
+    client.remove_object.side_effect = lambda bucket_name, object_name: bucket.objects.pop(object_name, None)
+    client.list_objects.side_effect = list_objects
+
+    return handler
+
+
+def add_file(bucket, file_path: str, file_hash: str):
+    """Add a file with its hash metadata to the in-memory bucket, without indexing it."""
+    bucket.objects[file_path] = b"content"
+    bucket.metadata[file_path] = {BucketCustomMetadata.FILE_HASH.value: file_hash}
+
+
+def index_key(file_hash: str) -> str:
+    return f"{MinioHandler.HASH_INDEX_PREFIX}/{FOLDER}/{file_hash}"
+
+
+def marker_key() -> str:
+    return f"{MinioHandler.HASH_INDEX_PREFIX}/{FOLDER}/{MinioHandler.HASH_INDEX_FOLDER_MARKER}"
+
+
+class TestFindFileHashInFolder:
+    """Tests for the folder hash index lookups."""
+
+    def test_index_hit_returns_indexed_file(self, minio_handler, bucket):
+        """Test that an index entry matching the file current hash is returned without scanning the folder."""
+        add_file(bucket, f"{FOLDER}/a.pdf", "hash_a")
+        minio_handler.add_file_hash_to_index(FOLDER, "hash_a", f"{FOLDER}/a.pdf")
+
+        assert minio_handler.find_file_hash_in_folder(FOLDER, "hash_a") == f"{FOLDER}/a.pdf"
+        minio_handler.client.list_objects.assert_not_called()
+
+    def test_index_miss_in_indexed_folder(self, minio_handler, bucket):
+        """Test that a missing entry in an indexed folder means the file isn't there, without scanning the folder."""
+        bucket.objects[marker_key()] = b" "
+
+        assert minio_handler.find_file_hash_in_folder(FOLDER, "hash_a") is None
+        minio_handler.client.list_objects.assert_not_called()
+
+    def test_stale_index_entry_is_removed(self, minio_handler, bucket):
+        """Test that an entry whose file was overwritten with another content is dropped, instead of skipping the upload."""
+        add_file(bucket, f"{FOLDER}/a.pdf", "hash_b")
+        minio_handler.add_file_hash_to_index(FOLDER, "hash_a", f"{FOLDER}/a.pdf")
+        bucket.objects[marker_key()] = b" "
+
+        assert minio_handler.find_file_hash_in_folder(FOLDER, "hash_a") is None
+        assert index_key("hash_a") not in bucket.objects
+
+    def test_unindexed_folder_is_scanned_and_marked(self, minio_handler, bucket):
+        """Test that a folder without index is scanned once, indexing its files and writing the marker."""
+        add_file(bucket, f"{FOLDER}/a.pdf", "hash_a")
+        add_file(bucket, f"{FOLDER}/b.pdf", "hash_b")
+
+        assert minio_handler.find_file_hash_in_folder(FOLDER, "hash_c") is None
+
+        assert bucket.objects[index_key("hash_a")] == f"{FOLDER}/a.pdf".encode()
+        assert bucket.objects[index_key("hash_b")] == f"{FOLDER}/b.pdf".encode()
+        assert marker_key() in bucket.objects
+
+    def test_scan_returns_duplicate(self, minio_handler, bucket):
+        """Test that the folder scan returns the file with the searched hash."""
+        add_file(bucket, f"{FOLDER}/a.pdf", "hash_a")
+
+        assert minio_handler.find_file_hash_in_folder(FOLDER, "hash_a") == f"{FOLDER}/a.pdf"
+
+    def test_files_written_during_the_scan_are_indexed(self, minio_handler, bucket):
+        """Test that files missed by the scan listing, written by concurrent uploads, are indexed after the marker."""
+        add_file(bucket, f"{FOLDER}/a.pdf", "hash_a")
+
+        listings = [[SimpleNamespace(object_name=f"{FOLDER}/a.pdf")]]
+
+        def list_objects(bucket_name, prefix, recursive):
+            if listings:
+                # The concurrent upload lands after the scan listing
+                add_file(bucket, f"{FOLDER}/b.pdf", "hash_b")
+                return listings.pop()
+            return [SimpleNamespace(object_name=name) for name in list(bucket.objects) if name.startswith(prefix)]
+
+        minio_handler.client.list_objects.side_effect = list_objects
+
+        assert minio_handler.find_file_hash_in_folder(FOLDER, "hash_b") == f"{FOLDER}/b.pdf"
+        assert bucket.objects[index_key("hash_b")] == f"{FOLDER}/b.pdf".encode()
+
+
+class TestSaveFileToBucket:
+    """Tests for the hash index updates done by save_file_to_bucket."""
+
+    def test_overwrite_keeps_index_consistent(self, minio_handler, bucket):
+        """Test that overwriting a file A with B and then A again uploads A again."""
+        bucket.objects[marker_key()] = b" "
+        file_path = f"{FOLDER}/a.pdf"
+
+        def save(content: bytes):
+            with patch('minio_handler.create_put_obj_metadata', return_value={BucketCustomMetadata.FILE_HASH.value: f"hash_{content.decode()}", "file_hash": f"hash_{content.decode()}"}):
+                minio_handler.save_file_to_bucket(file_path, BytesIO(content), "ts", "trace", Mock(), Mock(value="text/plain"), Mock())
+
+        save(b"a")
+        save(b"b")
+
+        assert index_key("hash_a") not in bucket.objects
+
+        save(b"a")
+
+        assert bucket.metadata[file_path][BucketCustomMetadata.FILE_HASH.value] == "hash_a"
+        assert bucket.objects[index_key("hash_a")] == file_path.encode()
@@ -0,0 +1,178 @@
+import pytest
+import numpy as np
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from opensearch_handler import OpensearchHandler
+import formats as fmts
+
+
+def make_handler(quantize_embeddings_to_int8: bool = False) -> OpensearchHandler:
+    """Create OpensearchHandler instance with mocked OpenSearch client and embeddings model, for an existing empty index."""
+    with patch('opensearch_handler.OpenSearch'), patch('opensearch_handler.SentenceTransformer'):
+        handler = OpensearchHandler(
+            logger=Mock(),
+            embeddings_model_name="multi-qa-MiniLM-L6-dot-v1",
+            embeddings_dim=4,
+            host="localhost",
+            port=9200,
+            password="admin-password",
+            quantize_embeddings_to_int8=quantize_embeddings_to_int8
+        )
+
+    handler.client.indices.exists.return_value = True
+    handler.client.indices.get_mapping.return_value = {"test_index": {"mappings": {"properties": {}}}}
+    handler.client.count.return_value = {"count": 0}
+
+    return handler
+
+
+@pytest.fixture
+def opensearch_handler():
+    """OpensearchHandler storing fp32 embeddings."""
+    return make_handler()
+
+
+@pytest.fixture
+def quantized_opensearch_handler():
+    """OpensearchHandler storing int8 quantized embeddings."""
+    return make_handler(quantize_embeddings_to_int8=True)
+
+
+@pytest.fixture
+def file_data_and_chunks():
+    """A file with 10 chunks, with only the fields read on ingestion."""
+    chunks = [SimpleNamespace(confidence=1.0, method="native", text=f"chunk {i}", page_start=i, page_end=i, tokens=2) for i in range(10)]
+    return {"stats": {"bucket_file_path": "gold/documents/cvm/itr.pdf"}, "chunks": chunks}
+
+
+@pytest.fixture(scope="session")
+def file_metadata():
+    """Sample file metadata dictionary."""
+    return {
+        fmts.BucketCustomMetadata.INGEST_TS.value: "2025-10-19T00:00:00",
+        fmts.BucketCustomMetadata.SOURCE.value: "CVM",
+        fmts.BucketCustomMetadata.FILE_HASH.value: "abc123hash",
+        fmts.BucketCustomMetadata.TRACE_ID.value: "test-trace-123",
+        fmts.BucketCustomMetadata.DOCUMENT_TYPE.value: "ITR",
+        fmts.BucketCustomMetadata.REF_DATE.value: "2025-09-30",
+    }
+
+
+def bulk_results(failing_ids = ()):
+    """Returns a helpers.parallel_bulk stand-in consuming the actions, failing the ones in 'failing_ids'."""
+    def parallel_bulk(client, actions, **kwargs):
+        for action in actions:
+            yield action["_id"] not in failing_ids, {"index": {"_id": action["_id"]}}
+    return parallel_bulk
+
+
+class TestIngestChunksToOpensearch:
+    """Tests for the bulk indexing of a file's chunks."""
+
+    def test_chunks_are_split_across_bulk_threads(self, opensearch_handler, file_data_and_chunks, file_metadata):
+        """Test that the bulk chunk size spreads a small file across all of the worker threads."""
+        with patch.object(opensearch_handler, 'get_embeddings_multi_qa', side_effect=lambda texts, batch_size: [[0.5] * 4 for _ in texts]), \
+             patch('opensearch_handler.helpers.parallel_bulk', side_effect=bulk_results()) as mock_bulk:
+            total = opensearch_handler.ingest_chunks_to_opensearch("test_index", file_data_and_chunks, file_metadata)
+
+        assert total == 10
+        assert mock_bulk.call_args.kwargs["chunk_size"] == 3
+        assert mock_bulk.call_args.kwargs["thread_count"] == OpensearchHandler.BULK_THREAD_COUNT
+
+    def test_failed_chunks_are_retried(self, opensearch_handler, file_data_and_chunks, file_metadata):
+        """Test that only the failed chunks are sent again."""
+        failed_id = "gold/documents/cvm/itr.pdf#chunk_3"
+        attempts = [bulk_results({failed_id}), bulk_results()]
+
+        with patch.object(opensearch_handler, 'get_embeddings_multi_qa', side_effect=lambda texts, batch_size: [[0.5] * 4 for _ in texts]), \
+             patch('opensearch_handler.helpers.parallel_bulk', side_effect=lambda *args, **kwargs: attempts.pop(0)(*args, **kwargs)) as mock_bulk, \
+             patch('opensearch_handler.time.sleep'):
+            total = opensearch_handler.ingest_chunks_to_opensearch("test_index", file_data_and_chunks, file_metadata)
+
+        assert total == 10
+        assert mock_bulk.call_count == 2
+        assert mock_bulk.call_args.kwargs["chunk_size"] == 1
+
+    def test_exhausted_retries_raise(self, opensearch_handler, file_data_and_chunks, file_metadata):
+        """Test that chunks still failing after max_retries attempts raise, instead of logging the file as indexed."""
+        failed_id = "gold/documents/cvm/itr.pdf#chunk_3"
+
+        with patch.object(opensearch_handler, 'get_embeddings_multi_qa', side_effect=lambda texts, batch_size: [[0.5] * 4 for _ in texts]), \
+             patch('opensearch_handler.helpers.parallel_bulk', side_effect=bulk_results({failed_id})) as mock_bulk, \
+             patch('opensearch_handler.time.sleep') as mock_sleep:
+            with pytest.raises(Exception, match="1 of the 10 chunks"):
+                opensearch_handler.ingest_chunks_to_opensearch("test_index", file_data_and_chunks, file_metadata, max_retries=3)
+
+        assert mock_bulk.call_count == 3
+        assert mock_sleep.call_count == 2
+        opensearch_handler.client.indices.refresh.assert_called_once_with(index="test_index")
+
+
+# L2 normalized embeddings of a query and two documents, the first document being the most similar to the query
+QUERY_EMBEDDING = [0.5, 0.5, 0.5, 0.5]
+DOCUMENTS_EMBEDDINGS = [[0.6, 0.4, 0.6, 0.34641016], [-0.1, 0.9, 0.3, -0.3]]
+
+
+class TestInt8Quantization:
+    """Tests for the int8 quantization of the embeddings."""
+
+    def test_inner_product_keeps_cosine_ranking(self, quantized_opensearch_handler):
+        """Test that the quantized vectors inner product is the cosine similarity scaled by QUANTIZATION_SCALE²."""
+        query = np.asarray(quantized_opensearch_handler.quantize_embeddings([QUERY_EMBEDDING])[0], dtype=np.int32)
+        documents = np.asarray(quantized_opensearch_handler.quantize_embeddings(DOCUMENTS_EMBEDDINGS), dtype=np.int32)
+
+        scores = documents @ query / OpensearchHandler.QUANTIZATION_SCALE ** 2
+        cosines = np.asarray(DOCUMENTS_EMBEDDINGS) @ np.asarray(QUERY_EMBEDDING)
+
+        np.testing.assert_allclose(scores, cosines, atol=0.02)
+        assert np.argmax(scores) == np.argmax(cosines)
+
+    def test_quantized_values_stay_in_int8_range(self, quantized_opensearch_handler):
+        """Test that the components at the limits of normalized vectors aren't wrapped around."""
+        assert quantized_opensearch_handler.quantize_embeddings([[1.0, -1.0, 0.0, 0.0]]) == [[127, -127, 0, 0]]
+
+    def test_query_is_quantized_as_the_documents(self, quantized_opensearch_handler):
+        """Test that the query embedding is quantized with the same scale of the index vectors."""
+        with patch.object(quantized_opensearch_handler, 'get_embeddings_multi_qa', return_value=[QUERY_EMBEDDING]):
+            assert quantized_opensearch_handler.get_query_embedding("receita liquida") == [64, 64, 64, 64]
+
+    def test_query_is_not_quantized_when_disabled(self, opensearch_handler):
+        """Test that the fp32 query embedding is returned as is without int8 quantization."""
+        with patch.object(opensearch_handler, 'get_embeddings_multi_qa', return_value=[QUERY_EMBEDDING]):
+            assert opensearch_handler.get_query_embedding("receita liquida") == QUERY_EMBEDDING
+
+    def test_new_index_saves_the_quantization_scale(self, quantized_opensearch_handler):
+        """Test that a new index has byte vectors and the quantization scale in its mapping '_meta'."""
+        quantized_opensearch_handler.client.indices.exists.return_value = False
+
+        quantized_opensearch_handler.ensure_index("test_index")
+
+        mappings = quantized_opensearch_handler.client.indices.create.call_args.kwargs["body"]["mappings"]
+        assert mappings["properties"]["embedding"]["data_type"] == "byte"
+        assert mappings["_meta"] == {OpensearchHandler.QUANTIZATION_SCALE_META_KEY: OpensearchHandler.QUANTIZATION_SCALE}
+
+    @pytest.mark.parametrize("quantize, embedding_field, meta", [
+        (True, {"type": "knn_vector", "dimension": 4}, {}),
+        (True, {"type": "knn_vector", "dimension": 4, "data_type": "byte"}, {}),
+        (True, {"type": "knn_vector", "dimension": 4, "data_type": "byte"}, {OpensearchHandler.QUANTIZATION_SCALE_META_KEY: 100}),
+        (False, {"type": "knn_vector", "dimension": 4, "data_type": "byte"}, {OpensearchHandler.QUANTIZATION_SCALE_META_KEY: 127}),
+    ])
+    def test_existing_index_with_other_vectors_is_rejected(self, quantize, embedding_field, meta):
+        """Test that reusing an index whose vectors were stored with another data type or int8 scale raises."""
+        handler = make_handler(quantize_embeddings_to_int8=quantize)
+        handler.client.indices.get_mapping.return_value = {"test_index": {"mappings": {"properties": {"embedding": embedding_field}, "_meta": meta}}}
+
+        with pytest.raises(ValueError, match="test_index"):
+            handler.ensure_index("test_index")
+
+    def test_existing_quantized_index_is_reused(self, quantized_opensearch_handler):
+        """Test that an index with the same data type and int8 scale is reused."""
+        quantized_opensearch_handler.client.indices.get_mapping.return_value = {"test_index": {"mappings": {
+            "properties": {"embedding": {"type": "knn_vector", "dimension": 4, "data_type": "byte"}},
+            "_meta": {OpensearchHandler.QUANTIZATION_SCALE_META_KEY: OpensearchHandler.QUANTIZATION_SCALE}
+        }}}
+
+        quantized_opensearch_handler.ensure_index("test_index")
+
+        quantized_opensearch_handler.client.indices.create.assert_not_called()
@@ -1,54 +1,93 @@
 import pytest
-import os
-from unittest.mock import Mock, MagicMock, patch, call
+import asyncio
+import logging
+from unittest.mock import Mock, MagicMock, AsyncMock, patch, call
 from io import BytesIO
-from collections import defaultdict
+from types import SimpleNamespace
 
-from ragflow_handler import RagflowHandler
+from ragflow_handler import RagflowHandler, AsyncRagflowHandler, get_upload_blob
 from ragflow_sdk.modules.dataset import DataSet
-from ragflow_sdk.modules.document import Document
 import formats as fmts
 
 
-@pytest.fixture(scope="session", autouse=True)
-def setup_env():
-    """Setup test environment variables."""
-    os.environ["COMPANY_NAME"] = "Test Company Inc"
-    os.environ["COMPANY_FORMATTED_CNPJ"] = "12.345.678/0001-90"
+# The RagFlow SDK client and PDF parser are mocked once for the whole module, see conftest.patched_ragflow
+pytestmark = pytest.mark.usefixtures("patched_ragflow")
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def mock_logger():
     """Create a mock logger."""
     return Mock()
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
+def null_logger():
+    """Create a logger discarding all records, for tests not checking the logged messages."""
+    logger = logging.getLogger("test.null")
+    logger.addHandler(logging.NullHandler())
+    logger.setLevel(logging.CRITICAL + 1)
+    logger.propagate = False
+    return logger
+
+
+@pytest.fixture(scope="module")
 def mock_ragflow_client():
     """Create a mock RAGFlow client."""
     return Mock()
 
 
-@pytest.fixture
-def ragflow_handler(mock_logger, mock_ragflow_client):
-    """Create RagflowHandler instance with mocked dependencies."""
-    with patch('ragflow_handler.RAGFlow') as mock_ragflow_class, \
-         patch('ragflow_handler.PDFParser') as mock_pdf_parser:
-        
-        mock_ragflow_class.return_value = mock_ragflow_client
-        mock_pdf_parser.return_value = Mock()
-        
-        handler = RagflowHandler(
-            logger=mock_logger,
-            base_url="http://localhost:9380",
-            api_key="test-api-key-123",
-            embeddings_model_name="nomic-embed-text"
-        )
-        
-        return handler
+@pytest.fixture(scope="module")
+def ragflow_handler(patched_ragflow, mock_logger, mock_ragflow_client):
+    """Create RagflowHandler instance with mocked dependencies, shared by all tests of the module."""
+    mock_ragflow_class, _ = patched_ragflow
+    mock_ragflow_class.return_value = mock_ragflow_client
+    
+    return RagflowHandler(
+        logger=mock_logger,
+        base_url="http://localhost:9380",
+        api_key="test-api-key-123",
+        embeddings_model_name="nomic-embed-text"
+    )
+
+
+@pytest.fixture(autouse=True)
+def reset_ragflow_handler(ragflow_handler):
+    """Reset the shared handler mocks and caches before each test, so a test doesn't leak into the next one."""
+    ragflow_handler.client.reset_mock(return_value=True, side_effect=True)
+    ragflow_handler.logger.reset_mock(return_value=True, side_effect=True)
+    ragflow_handler.dataset_cache.clear()
+    ragflow_handler.hash_index_cache.clear()
+    ragflow_handler.hash_index_build_times.clear()
+    ragflow_handler.pending_parses.clear()
+
+
+@pytest.fixture(scope="module")
+def doc_factory():
+    """
+    Returns a callable creating RagFlow documents stubs, with only the attributes read by the handler.
+    Avoids building RagFlow SDK Document specs in every test.
+    """
+    def make(name: str, file_hash: str = None, doc_id: str = None) -> Mock:
+        doc = Mock()
+        doc.name = name
+        doc.id = doc_id
+        doc.meta_fields = SimpleNamespace(file_hash=file_hash) if file_hash else SimpleNamespace()
+        return doc
+    
+    return make
 
 
 @pytest.fixture
+def handler_with_hashes(ragflow_handler, request):
+    """
+    Yields the shared handler, with get_all_files_hash_in_dataset patched to return the (file_name, file_hash) 
+    list passed through indirect parametrization, and the patched method mock.
+    """
+    with patch.object(ragflow_handler, 'get_all_files_hash_in_dataset', return_value=request.param) as mock_get_hashes:
+        yield ragflow_handler, mock_get_hashes
+
+
+@pytest.fixture(scope="session")
 def sample_file_metadata():
     """Sample file metadata dictionary."""
     return {
@@ -59,87 +98,93 @@ def sample_file_metadata():
     }
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_file_bytes():
-    """Sample file bytes."""
-    return BytesIO(b"PDF content here")
+    """Sample file bytes. Tests needing a buffer wrap them in their own BytesIO, so cursors aren't shared."""
+    return b"PDF content here"
+
+
+# Handler construction variants, in the format (base_url, api_key, embeddings_model_name)
+HANDLER_INIT_PARAMS = [
+    ("http://localhost:9380", "test-key", "nomic-embed-text"),
+    ("http://test.com:9380", "my-secret-key", "test-model")
+]
+
+# Datasets embedding models, in the format (embeddings_model_name, expected_embedding_model)
+CREATE_DATASET_PARAMS = [
+    ("nomic-embed-text", "nomic-embed-text@ollama"),
+    ("custom-model", "custom-model@ollama")
+]
 
 
 class TestRagflowHandlerInit:
     """Tests for RagflowHandler initialization."""
     
-    def test_init_creates_correct_attributes(self, mock_logger):
+    @pytest.mark.parametrize("base_url,api_key,model", HANDLER_INIT_PARAMS)
+    def test_init_creates_correct_attributes(self, patched_ragflow, mock_logger, base_url, api_key, model):
         """Test that RagflowHandler initializes with correct attributes."""
-        with patch('ragflow_handler.RAGFlow') as mock_ragflow_class, \
-             patch('ragflow_handler.PDFParser') as mock_pdf_parser:
-            
-            mock_client = Mock()
-            mock_ragflow_class.return_value = mock_client
-            
-            handler = RagflowHandler(
-                logger=mock_logger,
-                base_url="http://localhost:9380",
-                api_key="test-key",
-                embeddings_model_name="nomic-embed-text"
-            )
-            
-            assert handler.logger == mock_logger
-            assert handler.client == mock_client
-            assert handler.embeddings_model_name == "nomic-embed-text"
-            assert handler.pdf_parser is not None
+        mock_ragflow_class, _ = patched_ragflow
+        
+        mock_client = Mock()
+        mock_ragflow_class.return_value = mock_client
+        
+        handler = RagflowHandler(
+            logger=mock_logger,
+            base_url=base_url,
+            api_key=api_key,
+            embeddings_model_name=model
+        )
+        
+        assert handler.logger == mock_logger
+        assert handler.client == mock_client
+        assert handler.embeddings_model_name == model
+        assert handler.pdf_parser is not None
     
-    def test_init_creates_ragflow_client_with_correct_params(self, mock_logger):
+    @pytest.mark.parametrize("base_url,api_key,model", HANDLER_INIT_PARAMS)
+    def test_init_creates_ragflow_client_with_correct_params(self, patched_ragflow, null_logger, base_url, api_key, model):
         """Test that RAGFlow client is created with correct parameters."""
-        with patch('ragflow_handler.RAGFlow') as mock_ragflow_class, \
-             patch('ragflow_handler.PDFParser'):
-            
-            handler = RagflowHandler(
-                logger=mock_logger,
-                base_url="http://test.com:9380",
-                api_key="my-secret-key",
-                embeddings_model_name="test-model"
-            )
-            
-            mock_ragflow_class.assert_called_once_with(
-                base_url="http://test.com:9380",
-                api_key="my-secret-key"
-            )
+        mock_ragflow_class, _ = patched_ragflow
+        mock_ragflow_class.reset_mock()
+        
+        RagflowHandler(
+            logger=null_logger,
+            base_url=base_url,
+            api_key=api_key,
+            embeddings_model_name=model
+        )
+        
+        mock_ragflow_class.assert_called_once_with(
+            base_url=base_url,
+            api_key=api_key
+        )
 
 
 class TestCreateDataset:
     """Tests for create_dataset method."""
     
-    def test_create_dataset_success(self, ragflow_handler):
-        """Test successful dataset creation."""
-        dataset_name = "test_dataset"
-        
-        ragflow_handler.create_dataset(dataset_name)
+    @pytest.mark.parametrize("model,expected", CREATE_DATASET_PARAMS)
+    def test_create_dataset(self, patched_ragflow, null_logger, mock_ragflow_client, model, expected):
+        """Test that datasets are created with the handler embedding model."""
+        mock_ragflow_class, _ = patched_ragflow
+        mock_ragflow_class.return_value = mock_ragflow_client
         
-        ragflow_handler.client.create_dataset.assert_called_once_with(
-            name=dataset_name,
-            embedding_model="nomic-embed-text@ollama",
-            permission="team",
-            chunk_method="naive"
+        handler = RagflowHandler(
+            logger=null_logger,
+            base_url="http://localhost:9380",
+            api_key="test-key",
+            embeddings_model_name=model
         )
-    
-    def test_create_dataset_with_different_model(self, mock_logger, mock_ragflow_client):
-        """Test dataset creation with different embedding model."""
-        with patch('ragflow_handler.RAGFlow') as mock_ragflow_class, \
-             patch('ragflow_handler.PDFParser'):
-            
-            mock_ragflow_class.return_value = mock_ragflow_client
-            
-            handler = RagflowHandler(
-                logger=mock_logger,
-                base_url="http://localhost:9380",
-                api_key="test-key",
-                embeddings_model_name="custom-model"
-            )
-            
-            handler.create_dataset("my_dataset")
-            
-            call_args = mock_ragflow_client.create_dataset.call_args
-            assert call_args[1]['embedding_model'] == "custom-model@ollama"
+        
+        handler.create_dataset("test_dataset")
+        
+        assert mock_ragflow_client.create_dataset.call_count == 1
+        assert mock_ragflow_client.create_dataset.call_args.args == ()
+        assert mock_ragflow_client.create_dataset.call_args.kwargs == {
+            "name": "test_dataset",
+            "embedding_model": expected,
+            "permission": "team",
+            "chunk_method": "naive"
+        }
     
     def test_create_dataset_logs_on_error(self, ragflow_handler):
         """Test that errors during dataset creation are handled."""
@@ -149,18 +194,56 @@ class TestCreateDataset:
             ragflow_handler.create_dataset("test_dataset")
 
 
+class TestGetDataset:
+    """Tests for get_dataset and invalidate_dataset methods."""
+    
+    def test_get_dataset_reuses_cached_lookup(self, ragflow_handler):
+        """Test that the dataset lookup is done only once within the TTL."""
+        mock_dataset = Mock(spec=DataSet)
+        ragflow_handler.client.list_datasets.return_value = [mock_dataset]
+        
+        assert ragflow_handler.get_dataset("test_dataset") == mock_dataset
+        assert ragflow_handler.get_dataset("test_dataset") == mock_dataset
+        
+        ragflow_handler.client.list_datasets.assert_called_once_with(name="test_dataset")
+    
+    def test_get_dataset_refreshes_after_ttl(self, ragflow_handler):
+        """Test that an expired cached dataset is looked up again."""
+        ragflow_handler.client.list_datasets.return_value = [Mock(spec=DataSet)]
+        
+        with patch('ragflow_handler.time.monotonic', side_effect=[0, ragflow_handler.DATASET_CACHE_TTL + 1, ragflow_handler.DATASET_CACHE_TTL + 1]):
+            ragflow_handler.get_dataset("test_dataset")
+            ragflow_handler.get_dataset("test_dataset")
+        
+        assert ragflow_handler.client.list_datasets.call_count == 2
+    
+    def test_invalidate_dataset_forces_new_lookup(self, ragflow_handler):
+        """Test that invalidated datasets are looked up again."""
+        ragflow_handler.client.list_datasets.return_value = [Mock(spec=DataSet)]
+        
+        ragflow_handler.get_dataset("test_dataset")
+        ragflow_handler.invalidate_dataset("test_dataset")
+        ragflow_handler.get_dataset("test_dataset")
+        
+        assert ragflow_handler.client.list_datasets.call_count == 2
+    
+    def test_get_dataset_does_not_cache_failures(self, ragflow_handler):
+        """Test that failed lookups are propagated and not cached."""
+        ragflow_handler.client.list_datasets.return_value = []
+        
+        with pytest.raises(IndexError):
+            ragflow_handler.get_dataset("nonexistent")
+        
+        assert "nonexistent" not in ragflow_handler.dataset_cache
+
+
 class TestGetFilesInDataset:
     """Tests for get_files_in_dataset method."""
     
-    def test_get_files_success(self, ragflow_handler):
+    def test_get_files_success(self, ragflow_handler, doc_factory):
         """Test successful retrieval of files from dataset."""
         mock_dataset = Mock(spec=DataSet)
-        mock_doc1 = Mock(spec=Document)
-        mock_doc1.name = "file1.pdf"
-        mock_doc2 = Mock(spec=Document)
-        mock_doc2.name = "file2.pdf"
-        
-        mock_dataset.list_documents.return_value = [mock_doc1, mock_doc2]
+        mock_dataset.list_documents.return_value = [doc_factory("file1.pdf"), doc_factory("file2.pdf")]
         ragflow_handler.client.list_datasets.return_value = [mock_dataset]
         
         dataset, documents = ragflow_handler.get_files_in_dataset(
@@ -170,7 +253,9 @@ class TestGetFilesInDataset:
         
         assert dataset == mock_dataset
         assert len(documents) == 2
-        mock_dataset.list_documents.assert_called_once_with(keywords="file1.pdf")
+        assert mock_dataset.list_documents.call_count == 1
+        assert mock_dataset.list_documents.call_args.args == ()
+        assert mock_dataset.list_documents.call_args.kwargs == {"keywords": "file1.pdf"}
     
     def test_get_files_dataset_not_found(self, ragflow_handler):
         """Test error when dataset doesn't exist."""
@@ -208,82 +293,533 @@ class TestGetFilesInDataset:
         assert documents == []
 
 
+# Documents in the dataset and expected hashes, in the format ([(file_name, file_hash)], [(file_name, file_hash)])
+GET_ALL_HASHES_CASES = [
+    ([("file1.pdf", "hash123"), ("file2.pdf", "hash456")], [("file1.pdf", "hash123"), ("file2.pdf", "hash456")]),
+    ([("file.pdf", None)], [("file.pdf", None)]),
+    ([], [])
+]
+
+
 class TestGetAllFilesHashInDataset:
     """Tests for get_all_files_hash_in_dataset method."""
     
-    def test_get_all_hashes_success(self, ragflow_handler):
-        """Test successful retrieval of all file hashes."""
+    @pytest.mark.parametrize("docs,expected", GET_ALL_HASHES_CASES)
+    def test_get_all_hashes(self, ragflow_handler, doc_factory, docs, expected):
+        """Test retrieval of all file hashes, documents without file_hash attribute getting None."""
         mock_dataset = Mock(spec=DataSet)
+        mock_dataset.list_documents.return_value = [doc_factory(name, file_hash) for name, file_hash in docs]
         
-        mock_doc1 = Mock(spec=Document)
-        mock_doc1.name = "file1.pdf"
-        mock_doc1.meta_fields = Mock()
-        mock_doc1.meta_fields.file_hash = "hash123"
-        
-        mock_doc2 = Mock(spec=Document)
-        mock_doc2.name = "file2.pdf"
-        mock_doc2.meta_fields = Mock()
-        mock_doc2.meta_fields.file_hash = "hash456"
-        
-        mock_dataset.list_documents.return_value = [mock_doc1, mock_doc2]
-        
-        result = ragflow_handler.get_all_files_hash_in_dataset(mock_dataset)
-        
-        assert len(result) == 2
-        assert ["file1.pdf", "hash123"] in result
-        assert ["file2.pdf", "hash456"] in result
+        assert ragflow_handler.get_all_files_hash_in_dataset(mock_dataset) == expected
     
-    def test_get_all_hashes_missing_hash_attribute(self, ragflow_handler):
-        """Test handling documents without file_hash attribute."""
+    def test_get_all_hashes_fetches_all_pages(self, ragflow_handler, doc_factory):
+        """Test that documents beyond the first page are listed."""
         mock_dataset = Mock(spec=DataSet)
         
-        mock_doc = Mock(spec=Document)
-        mock_doc.name = "file.pdf"
-        mock_doc.meta_fields = Mock(spec=[])  # No file_hash attribute
+        mock_docs = [doc_factory(f"file{i}.pdf", f"hash{i}") for i in range(3)]
         
-        mock_dataset.list_documents.return_value = [mock_doc]
+        mock_dataset.list_documents.side_effect = [mock_docs[:2], mock_docs[2:]]
         
-        result = ragflow_handler.get_all_files_hash_in_dataset(mock_dataset)
+        with patch.object(ragflow_handler, 'LIST_DOCUMENTS_PAGE_SIZE', 2):
+            result = ragflow_handler.get_all_files_hash_in_dataset(mock_dataset)
         
-        assert len(result) == 1
-        assert result[0] == ["file.pdf", None]
+        assert result == [("file0.pdf", "hash0"), ("file1.pdf", "hash1"), ("file2.pdf", "hash2")]
+        assert mock_dataset.list_documents.call_args_list == [call(page=1, page_size=2), call(page=2, page_size=2)]
+
+
+class TestDedupCheck:
+    """Tests for dedup_check and mark_uploaded methods."""
     
-    def test_get_all_hashes_empty_dataset(self, ragflow_handler):
-        """Test with empty dataset."""
-        mock_dataset = Mock(spec=DataSet)
-        mock_dataset.list_documents.return_value = []
+    def test_dedup_check_returns_existing_file_name(self, ragflow_handler):
+        """Test that files are found by hash in the dataset."""
+        ragflow_handler.client.list_datasets.return_value = [Mock(spec=DataSet)]
         
-        result = ragflow_handler.get_all_files_hash_in_dataset(mock_dataset)
+        with patch.object(ragflow_handler, 'get_all_files_hash_in_dataset', return_value=[("existing_file.pdf", "abc123hash")]):
+            assert ragflow_handler.dedup_check("test_dataset", "abc123hash") == "existing_file.pdf"
+            assert ragflow_handler.dedup_check("test_dataset", "other_hash") is None
+    
+    def test_mark_uploaded_updates_index_without_refresh(self, ragflow_handler):
+        """Test that uploaded files are found without listing the dataset again."""
+        ragflow_handler.client.list_datasets.return_value = [Mock(spec=DataSet)]
+        
+        with patch.object(ragflow_handler, 'get_all_files_hash_in_dataset', return_value=[]) as mock_get_hashes:
+            assert ragflow_handler.dedup_check("test_dataset", "abc123hash") is None
+            
+            ragflow_handler.mark_uploaded("test_dataset", "abc123hash", "new_file.pdf")
+            
+            assert ragflow_handler.dedup_check("test_dataset", "abc123hash") == "new_file.pdf"
+            mock_get_hashes.assert_called_once()
+    
+    def test_dedup_check_refreshes_after_ttl(self, ragflow_handler):
+        """Test that an expired hash index is rebuilt."""
+        ragflow_handler.client.list_datasets.return_value = [Mock(spec=DataSet)]
         
-        assert result == []
+        with patch.object(ragflow_handler, 'get_all_files_hash_in_dataset', return_value=[]) as mock_get_hashes:
+            ragflow_handler.dedup_check("test_dataset", "abc123hash")
+            
+            ragflow_handler.hash_index_build_times["test_dataset"] -= ragflow_handler.HASH_INDEX_CACHE_TTL
+            
+            ragflow_handler.dedup_check("test_dataset", "abc123hash")
+            
+            assert mock_get_hashes.call_count == 2
 
 
 class TestUploadDocumentAndStartParse:
     """Tests for upload_document_and_start_parse method."""
     
-    def test_upload_skips_duplicate_file(self, ragflow_handler, sample_file_bytes, sample_file_metadata):
+    @pytest.mark.parametrize("handler_with_hashes", [[("existing_file.pdf", "abc123hash")]], indirect=True)  # Same hash as sample_file_metadata
+    def test_upload_skips_duplicate_file(self, handler_with_hashes, sample_file_bytes, sample_file_metadata):
         """Test that duplicate files are not uploaded."""
+        ragflow_handler, _ = handler_with_hashes
+        
         mock_dataset = Mock(spec=DataSet)
         ragflow_handler.client.list_datasets.return_value = [mock_dataset]
         
-        # Mock existing file with same hash
-        with patch.object(ragflow_handler, 'get_all_files_hash_in_dataset') as mock_get_hashes:
-            mock_get_hashes.return_value = [
-                ["existing_file.pdf", "abc123hash"]  # Same hash as sample_file_metadata
-            ]
-            
+        ragflow_handler.upload_document_and_start_parse(
+            dataset_name="test_dataset",
+            file_name="test.pdf",
+            file_bytes=BytesIO(sample_file_bytes),
+            file_metadata=sample_file_metadata
+        )
+        
+        # Verify upload was NOT called
+        mock_dataset.upload_documents.assert_not_called()
+        
+        # Verify warning was logged
+        ragflow_handler.logger.warning.assert_called_once()
+
+    @pytest.mark.parametrize("handler_with_hashes", [[("existing_file.pdf", "abc123hash")]], indirect=True)
+    def test_upload_builds_hash_index_once_per_dataset(self, handler_with_hashes, sample_file_bytes, sample_file_metadata):
+        """Test that the dataset files are listed only once for several uploads."""
+        ragflow_handler, mock_get_hashes = handler_with_hashes
+        
+        mock_dataset = Mock(spec=DataSet)
+        ragflow_handler.client.list_datasets.return_value = [mock_dataset]
+        
+        for _ in range(3):
             ragflow_handler.upload_document_and_start_parse(
                 dataset_name="test_dataset",
                 file_name="test.pdf",
-                file_bytes=sample_file_bytes,
+                file_bytes=BytesIO(sample_file_bytes),
                 file_metadata=sample_file_metadata
             )
+        
+        mock_get_hashes.assert_called_once_with(mock_dataset)
+        assert ragflow_handler.hash_index_cache["test_dataset"] == {"abc123hash": "existing_file.pdf"}
+
+
+class TestGetUploadBlob:
+    """Tests for get_upload_blob function."""
+    
+    def test_bytes_are_passed_through(self):
+        """Test that bytes payloads are not copied nor wrapped."""
+        payload = b"PDF content here"
+        
+        assert get_upload_blob(payload) is payload
+    
+    def test_bytes_io_is_passed_rewound(self, sample_file_bytes):
+        """Test that BytesIO payloads are passed as is, from their start, instead of a copy of their content."""
+        file_obj = BytesIO(sample_file_bytes)
+        file_obj.read()
+        
+        assert get_upload_blob(file_obj) is file_obj
+        assert file_obj.tell() == 0
+    
+    def test_other_file_objects_are_passed_rewound(self, tmp_path):
+        """Test that other file objects are passed as is, from their start."""
+        file_path = tmp_path / "test.pdf"
+        file_path.write_bytes(b"PDF content here")
+        
+        with open(file_path, "rb") as file_obj:
+            file_obj.read()
             
-            # Verify upload was NOT called
-            mock_dataset.upload_documents.assert_not_called()
+            assert get_upload_blob(file_obj) is file_obj
+            assert file_obj.tell() == 0
+
+
+class TestIsPdfTextNative:
+    """Tests for is_pdf_text_native method."""
+    
+    def test_invalid_pdf_is_not_native(self, ragflow_handler, sample_file_bytes):
+        """Test that files that can't be opened as PDFs are treated as not native."""
+        assert ragflow_handler.is_pdf_text_native(BytesIO(sample_file_bytes)) is False
+        ragflow_handler.logger.warning.assert_called_once()
+    
+    def test_pdf_with_text_in_all_pages_is_native(self, ragflow_handler):
+        """Test that PDFs with text in every page are native."""
+        mock_pdf = MagicMock()
+        mock_pdf.__enter__.return_value = mock_pdf
+        mock_pdf.page_count = 2
+        mock_pdf.__iter__.return_value = iter([Mock(get_text=Mock(return_value="Balanço")), Mock(get_text=Mock(return_value="DRE"))])
+        
+        with patch('ragflow_handler.pymupdf.open', return_value=mock_pdf):
+            assert ragflow_handler.is_pdf_text_native(b"%PDF") is True
+    
+    def test_pdf_with_scanned_page_is_not_native(self, ragflow_handler):
+        """Test that PDFs with any page without text are not native."""
+        mock_pdf = MagicMock()
+        mock_pdf.__enter__.return_value = mock_pdf
+        mock_pdf.page_count = 2
+        mock_pdf.__iter__.return_value = iter([Mock(get_text=Mock(return_value="Balanço")), Mock(get_text=Mock(return_value="  "))])
+        
+        with patch('ragflow_handler.pymupdf.open', return_value=mock_pdf):
+            assert ragflow_handler.is_pdf_text_native(b"%PDF") is False
+
+
+class TestBuildDocumentMetaFields:
+    """Tests for build_document_meta_fields method."""
+    
+    def test_meta_fields_payload(self, ragflow_handler, sample_file_metadata):
+        """Test that the update payload holds the company and file metadata."""
+        payload = ragflow_handler.build_document_meta_fields(sample_file_metadata)
+        
+        assert payload["meta_fields"] == {
+            "empresa": "Test Company Inc",
+            "CNPJ": "12.345.678/0001-90",
+            "origem": "CVM",
+            "tipo_documento": "ITR",
+            "file_hash": "abc123hash",
+            "tipo_agregacao_demonstrativo_financeiro": "Consolidado",
+            "pdf_is_native": False
+        }
+        assert payload["chunk_method"] == "naive"
+        assert payload["parser_config"] == ragflow_handler.NAIVE_PARSER_CONFIG
+    
+    def test_native_pdf_skips_layout_recognition(self, ragflow_handler, sample_file_metadata):
+        """Test that native text PDFs are parsed without layout recognition."""
+        payload = ragflow_handler.build_document_meta_fields(sample_file_metadata, is_pdf_text_native=True)
+        
+        assert payload["meta_fields"]["pdf_is_native"] is True
+        assert payload["parser_config"]["layout_recognize"] is False
+        assert ragflow_handler.NAIVE_PARSER_CONFIG["layout_recognize"] is True
+    
+    def test_meta_fields_without_aggregation_type(self, ragflow_handler, sample_file_metadata):
+        """Test that the aggregation type is only set when present."""
+        file_metadata = {key: value for key, value in sample_file_metadata.items() 
+                         if key != fmts.BucketCustomMetadata.AGGREGATION_TYPE.value}
+        
+        payload = ragflow_handler.build_document_meta_fields(file_metadata)
+        
+        assert "tipo_agregacao_demonstrativo_financeiro" not in payload["meta_fields"]
+
+
+class TestUploadDocumentsBatch:
+    """Tests for upload_documents_batch method."""
+    
+    def test_batch_uses_single_upload_and_parse_requests(self, ragflow_handler, doc_factory, sample_file_metadata):
+        """Test that a batch of new files is uploaded and parsed with one request each."""
+        mock_dataset = Mock(spec=DataSet)
+        ragflow_handler.client.list_datasets.return_value = [mock_dataset]
+        
+        other_file_metadata = dict(sample_file_metadata)
+        other_file_metadata[fmts.BucketCustomMetadata.FILE_HASH.value] = "def456hash"
+        
+        docs = [doc_factory("a.pdf", doc_id="id1"), doc_factory("b.pdf", doc_id="id2")]
+        mock_dataset.upload_documents.return_value = docs
+        
+        with patch.object(ragflow_handler, 'get_all_files_hash_in_dataset', return_value=[]):
+            ragflow_handler.upload_documents_batch(
+                dataset_name="test_dataset",
+                items=[
+                    ("folder/a.pdf", BytesIO(b"a"), sample_file_metadata),
+                    ("folder/b.pdf", BytesIO(b"b"), other_file_metadata),
+                    ("folder/a_copy.pdf", BytesIO(b"a"), sample_file_metadata)
+                ]
+            )
+        
+        mock_dataset.upload_documents.assert_called_once()
+        assert [(doc["display_name"], doc["blob"].getvalue()) for doc in mock_dataset.upload_documents.call_args.args[0]] == [("a.pdf", b"a"), ("b.pdf", b"b")]
+        mock_dataset.async_parse_documents.assert_called_once_with(["id1", "id2"])
+        
+        for doc in docs:
+            doc.update.assert_called_once()
+        
+        assert docs[1].update.call_args[0][0]["meta_fields"]["file_hash"] == "def456hash"
+        mock_dataset.list_documents.assert_not_called()
+    
+    def test_batch_failed_metadata_update_does_not_block_others(self, ragflow_handler, doc_factory, sample_file_metadata):
+        """Test that documents with successful metadata updates are still parsed."""
+        mock_dataset = Mock(spec=DataSet)
+        ragflow_handler.client.list_datasets.return_value = [mock_dataset]
+        
+        other_file_metadata = dict(sample_file_metadata)
+        other_file_metadata[fmts.BucketCustomMetadata.FILE_HASH.value] = "def456hash"
+        
+        failed_doc = doc_factory("a.pdf", doc_id="id1")
+        failed_doc.update.side_effect = Exception("Update failed")
+        
+        ok_doc = doc_factory("b.pdf", doc_id="id2")
+        
+        mock_dataset.upload_documents.return_value = [failed_doc, ok_doc]
+        
+        with patch.object(ragflow_handler, 'get_all_files_hash_in_dataset', return_value=[]):
+            with pytest.raises(Exception, match="a.pdf"):
+                ragflow_handler.upload_documents_batch(
+                    dataset_name="test_dataset",
+                    items=[
+                        ("a.pdf", BytesIO(b"a"), sample_file_metadata),
+                        ("b.pdf", BytesIO(b"b"), other_file_metadata)
+                    ]
+                )
+        
+        ok_doc.update.assert_called_once()
+        mock_dataset.async_parse_documents.assert_called_once_with(["id2"])
+
+    def test_batch_uploads_same_named_files_with_different_hashes(self, ragflow_handler, doc_factory, sample_file_metadata):
+        """Test that files with the same name but different contents are all uploaded, under unique display names."""
+        mock_dataset = Mock(spec=DataSet)
+        ragflow_handler.client.list_datasets.return_value = [mock_dataset]
+
+        other_file_metadata = dict(sample_file_metadata)
+        other_file_metadata[fmts.BucketCustomMetadata.FILE_HASH.value] = "def456hash"
+
+        mock_dataset.upload_documents.return_value = [doc_factory("a.pdf", doc_id="id1"), doc_factory("a(1).pdf", doc_id="id2")]
+
+        with patch.object(ragflow_handler, 'get_all_files_hash_in_dataset', return_value=[]):
+            ragflow_handler.upload_documents_batch(
+                dataset_name="test_dataset",
+                items=[
+                    ("2023/a.pdf", BytesIO(b"a"), sample_file_metadata),
+                    ("2024/a.pdf", BytesIO(b"b"), other_file_metadata)
+                ]
+            )
+
+        mock_dataset.upload_documents.assert_called_once()
+        assert [(doc["display_name"], doc["blob"].getvalue()) for doc in mock_dataset.upload_documents.call_args.args[0]] == [("a.pdf", b"a"), ("a(1).pdf", b"b")]
+        mock_dataset.async_parse_documents.assert_called_once_with(["id1", "id2"])
+        assert ragflow_handler.hash_index_cache["test_dataset"] == {"abc123hash": "a.pdf", "def456hash": "a(1).pdf"}
+
+    def test_batch_indexes_only_confirmed_documents(self, ragflow_handler, doc_factory, sample_file_metadata):
+        """Test that files without a returned document aren't marked as uploaded, and the index is rebuilt."""
+        mock_dataset = Mock(spec=DataSet)
+        ragflow_handler.client.list_datasets.return_value = [mock_dataset]
+
+        other_file_metadata = dict(sample_file_metadata)
+        other_file_metadata[fmts.BucketCustomMetadata.FILE_HASH.value] = "def456hash"
+
+        mock_dataset.upload_documents.return_value = [doc_factory("a.pdf", doc_id="id1")]
+
+        with patch.object(ragflow_handler, 'get_all_files_hash_in_dataset', return_value=[]):
+            ragflow_handler.upload_documents_batch(
+                dataset_name="test_dataset",
+                items=[
+                    ("a.pdf", BytesIO(b"a"), sample_file_metadata),
+                    ("b.pdf", BytesIO(b"b"), other_file_metadata)
+                ]
+            )
+
+        mock_dataset.async_parse_documents.assert_called_once_with(["id1"])
+        assert "test_dataset" not in ragflow_handler.hash_index_cache
+
+
+class TestParseRequests:
+    """Tests for the parse requests sent after the uploads."""
+    
+    @pytest.fixture
+    def background_ragflow_handler(self, patched_ragflow, null_logger, mock_ragflow_client):
+        """Create RagflowHandler instance requesting the parses in background."""
+        mock_ragflow_class, _ = patched_ragflow
+        mock_ragflow_class.return_value = mock_ragflow_client
+        
+        handler = RagflowHandler(
+            logger=null_logger,
+            base_url="http://localhost:9380",
+            api_key="test-api-key-123",
+            embeddings_model_name="nomic-embed-text",
+            parse_in_background=True
+        )
+        
+        yield handler
+        
+        handler.parse_pool.shutdown(wait=True)
+    
+    def test_failed_parse_request_raises_in_the_caller(self, ragflow_handler, doc_factory, sample_file_metadata):
+        """Test that parse requests are sent before the upload returns by default, so their errors reach the caller."""
+        mock_dataset = Mock(spec=DataSet)
+        mock_dataset.async_parse_documents.side_effect = Exception("Parse failed")
+        ragflow_handler.client.list_datasets.return_value = [mock_dataset]
+        mock_dataset.upload_documents.return_value = [doc_factory("a.pdf", doc_id="id1")]
+        
+        with patch.object(ragflow_handler, 'get_all_files_hash_in_dataset', return_value=[]):
+            with pytest.raises(Exception, match="Parse failed"):
+                ragflow_handler.upload_documents_batch("test_dataset", [("a.pdf", BytesIO(b"a"), sample_file_metadata)])
+        
+        assert ragflow_handler.parse_pool is None
+        assert ragflow_handler.pending_parses == []
+    
+    def test_background_parse_requests_are_waited(self, background_ragflow_handler, doc_factory, sample_file_metadata):
+        """Test that handlers opting in queue the parse requests, which wait_pending waits for."""
+        mock_dataset = Mock(spec=DataSet)
+        background_ragflow_handler.client.list_datasets.return_value = [mock_dataset]
+        mock_dataset.upload_documents.return_value = [doc_factory("a.pdf", doc_id="id1")]
+        
+        with patch.object(background_ragflow_handler, 'get_all_files_hash_in_dataset', return_value=[]):
+            background_ragflow_handler.upload_documents_batch("test_dataset", [("a.pdf", BytesIO(b"a"), sample_file_metadata)])
+        
+        assert len(background_ragflow_handler.pending_parses) == 1
+        
+        background_ragflow_handler.wait_pending()
+        
+        mock_dataset.async_parse_documents.assert_called_once_with(["id1"])
+        assert background_ragflow_handler.pending_parses == []
+    
+    def test_wait_pending_raises_on_failed_parse_request(self, background_ragflow_handler):
+        """Test that failed background parse requests are reported."""
+        mock_dataset = Mock(spec=DataSet)
+        mock_dataset.async_parse_documents.side_effect = Exception("Parse failed")
+        
+        background_ragflow_handler.pending_parses.append(
+            (background_ragflow_handler.parse_pool.submit(mock_dataset.async_parse_documents, ["id1"]), ["a.pdf"])
+        )
+        
+        with pytest.raises(Exception, match="a.pdf"):
+            background_ragflow_handler.wait_pending()
+        
+        assert background_ragflow_handler.pending_parses == []
+
+
+class TestAsyncUploadDocumentsBatch:
+    """Tests for AsyncRagflowHandler.upload_documents_batch method."""
+    
+    @pytest.fixture
+    def async_ragflow_handler(self, patched_ragflow, null_logger, mock_ragflow_client):
+        """Create AsyncRagflowHandler instance with mocked dependencies."""
+        mock_ragflow_class, _ = patched_ragflow
+        mock_ragflow_class.return_value = mock_ragflow_client
+        
+        with patch('ragflow_handler.httpx.AsyncClient'):
             
-            # Verify warning was logged
-            ragflow_handler.logger.warning.assert_called_once()
+            return AsyncRagflowHandler(
+                logger=null_logger,
+                base_url="http://localhost:9380",
+                api_key="test-api-key-123",
+                embeddings_model_name="nomic-embed-text"
+            )
+    
+    def test_async_batch_uploads_and_parses_once(self, async_ragflow_handler, sample_file_metadata):
+        """Test that new files are uploaded with their metadata and parsed with a single request."""
+        mock_dataset = Mock(spec=DataSet)
+        mock_dataset.id = "dataset_id"
+        async_ragflow_handler.client.list_datasets.return_value = [mock_dataset]
+        
+        other_file_metadata = dict(sample_file_metadata)
+        other_file_metadata[fmts.BucketCustomMetadata.FILE_HASH.value] = "def456hash"
+        
+        async def mock_request(method, path, **kwargs):
+            if method == "POST" and path.endswith("/documents"):
+                return [{"id": f"id_{kwargs['files'][0][1][0]}", "name": kwargs['files'][0][1][0]}]
+            return None
+        
+        with patch.object(async_ragflow_handler, 'get_all_files_hash_in_dataset', return_value=[("existing.pdf", "abc123hash")]), \
+             patch.object(async_ragflow_handler, 'request', AsyncMock(side_effect=mock_request)) as mock_req:
+            asyncio.run(async_ragflow_handler.upload_documents_batch(
+                dataset_name="test_dataset",
+                items=[
+                    ("a.pdf", BytesIO(b"a"), sample_file_metadata),
+                    ("b.pdf", BytesIO(b"b"), other_file_metadata)
+                ]
+            ))
+        
+        uploads = [c for c in mock_req.call_args_list if c.args[1].endswith("/documents")]
+        assert len(uploads) == 1
+        
+        mock_req.assert_any_call("PUT", "/datasets/dataset_id/documents/id_b.pdf", json=async_ragflow_handler.build_document_meta_fields(other_file_metadata))
+        mock_req.assert_called_with("POST", "/datasets/dataset_id/chunks", json={"document_ids": ["id_b.pdf"]})
+        assert async_ragflow_handler.dedup_check("test_dataset", "def456hash") == "b.pdf"
+
+    def test_async_batch_uploads_same_named_files_with_different_hashes(self, async_ragflow_handler, sample_file_metadata):
+        """Test that files with the same name but different contents are all uploaded and indexed, under unique display names."""
+        mock_dataset = Mock(spec=DataSet)
+        mock_dataset.id = "dataset_id"
+        async_ragflow_handler.client.list_datasets.return_value = [mock_dataset]
+
+        other_file_metadata = dict(sample_file_metadata)
+        other_file_metadata[fmts.BucketCustomMetadata.FILE_HASH.value] = "def456hash"
+
+        async def mock_request(method, path, **kwargs):
+            if method == "POST" and path.endswith("/documents"):
+                return [{"id": f"id_{kwargs['files'][0][1][0]}", "name": kwargs['files'][0][1][0]}]
+            return None
+
+        with patch.object(async_ragflow_handler, 'get_all_files_hash_in_dataset', return_value=[]), \
+             patch.object(async_ragflow_handler, 'request', AsyncMock(side_effect=mock_request)) as mock_req:
+            asyncio.run(async_ragflow_handler.upload_documents_batch(
+                dataset_name="test_dataset",
+                items=[
+                    ("2023/a.pdf", BytesIO(b"a"), sample_file_metadata),
+                    ("2024/a.pdf", BytesIO(b"b"), other_file_metadata)
+                ]
+            ))
+
+        mock_req.assert_called_with("POST", "/datasets/dataset_id/chunks", json={"document_ids": ["id_a.pdf", "id_a(1).pdf"]})
+        assert async_ragflow_handler.hash_index_cache["test_dataset"] == {"abc123hash": "a.pdf", "def456hash": "a(1).pdf"}
+
+    def test_async_single_file_upload_is_awaited(self, async_ragflow_handler, sample_file_metadata):
+        """Test that the single file entry point uploads and parses the file, instead of returning a never awaited batch."""
+        mock_dataset = Mock(spec=DataSet)
+        mock_dataset.id = "dataset_id"
+        async_ragflow_handler.client.list_datasets.return_value = [mock_dataset]
+
+        async def mock_request(method, path, **kwargs):
+            if method == "POST" and path.endswith("/documents"):
+                return [{"id": "id_a", "name": "a.pdf"}]
+            return None
+
+        with patch.object(async_ragflow_handler, 'get_all_files_hash_in_dataset', return_value=[]), \
+             patch.object(async_ragflow_handler, 'request', AsyncMock(side_effect=mock_request)) as mock_req:
+            asyncio.run(async_ragflow_handler.upload_document_and_start_parse(
+                dataset_name="test_dataset",
+                file_name="folder/a.pdf",
+                file_bytes=BytesIO(b"a"),
+                file_metadata=sample_file_metadata
+            ))
+
+        mock_req.assert_called_with("POST", "/datasets/dataset_id/chunks", json={"document_ids": ["id_a"]})
+        assert async_ragflow_handler.dedup_check("test_dataset", "abc123hash") == "a.pdf"
+
+    def test_async_batch_indexes_the_name_returned_by_ragflow(self, async_ragflow_handler, sample_file_metadata):
+        """Test that files renamed by RagFlow are indexed under the returned name, as the sync handler does."""
+        mock_dataset = Mock(spec=DataSet)
+        mock_dataset.id = "dataset_id"
+        async_ragflow_handler.client.list_datasets.return_value = [mock_dataset]
+
+        async def mock_request(method, path, **kwargs):
+            if method == "POST" and path.endswith("/documents"):
+                return [{"id": "id_a", "name": "a(1).pdf"}]
+            return None
+
+        with patch.object(async_ragflow_handler, 'get_all_files_hash_in_dataset', return_value=[]), \
+             patch.object(async_ragflow_handler, 'request', AsyncMock(side_effect=mock_request)):
+            asyncio.run(async_ragflow_handler.upload_documents_batch("test_dataset", [("a.pdf", BytesIO(b"a"), sample_file_metadata)]))
+
+        assert async_ragflow_handler.hash_index_cache["test_dataset"] == {"abc123hash": "a(1).pdf"}
+
+    def test_async_upload_of_non_seekable_stream_sends_the_content(self, async_ragflow_handler, sample_file_metadata):
+        """Test that non seekable streams are uploaded whole, instead of being consumed by the native text check."""
+        class NonSeekableStream:
+            def __init__(self, data):
+                self.stream = BytesIO(data)
+
+            def read(self, size=-1):
+                return self.stream.read(size)
+
+            def seekable(self):
+                return False
+
+        mock_request = AsyncMock(return_value=[{"id": "id_a", "name": "a.pdf"}])
+
+        with patch.object(async_ragflow_handler, 'request', mock_request):
+            asyncio.run(async_ragflow_handler.upload_document("dataset_id", "a.pdf", NonSeekableStream(b"PDF content"),
+                                                              sample_file_metadata, asyncio.Semaphore(1)))
+
+        assert mock_request.call_args_list[0].kwargs["files"] == [("file", ("a.pdf", b"PDF content"))]
+
+
+# Expected NAIVE_PARSER_CONFIG values, besides the nested raptor config
+EXPECTED_PARSER_SUBSET = {"chunk_count": 512,
+                          "delimiter": "\\n",
+                          "html4excel": False,
+                          "layout_recognize": True}
 
 
 class TestNaiveParserConfig:
@@ -293,18 +829,10 @@ class TestNaiveParserConfig:
         """Test that parser config has correct structure."""
         config = ragflow_handler.NAIVE_PARSER_CONFIG
         
-        assert "chunk_count" in config
-        assert config["chunk_count"] == 512
-        assert "delimiter" in config
-        assert config["delimiter"] == "\\n"
-        assert "html4excel" in config
-        assert config["html4excel"] is False
-        assert "layout_recognize" in config
-        assert config["layout_recognize"] is True
-        assert "raptor" in config
+        assert {key: config.get(key) for key in EXPECTED_PARSER_SUBSET} == EXPECTED_PARSER_SUBSET
         assert config["raptor"]["use_raptor"] is False
 
 
 # Run with: pytest test_ragflow_handler.py -v
-# Debug: pytest test_ragflow_handler.py::TestUploadDocumentAndStartParse::test_upload_new_document_success -v --pdb
+# Debug: pytest test_ragflow_handler.py::TestUploadDocumentAndStartParse::test_upload_new_document_success -v -n0 --pdb
 # Coverage: pytest test_ragflow_handler.py --cov=ragflow_handler --cov-report=html
\ No newline at end of file
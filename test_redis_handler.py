@@ -0,0 +1,268 @@
+import pytest
+import asyncio
+import orjson
+import zstandard
+import pandas as pd
+from datetime import datetime
+from unittest.mock import Mock, MagicMock, AsyncMock, patch
+
+from redis_handler import RedisHandler, AsyncRedisHandler, build_cache_payload, COMPRESSION_MIN_PAYLOAD_SIZE, ZSTD_FRAME_MAGIC
+import formats as fmts
+
+
+@pytest.fixture(autouse=True)
+def clear_connection_pools():
+    """Clear the shared connection pools and clients around each test, so the ones created by a test don't leak to the next one."""
+    RedisHandler.CONNECTION_POOLS.clear()
+    AsyncRedisHandler.CONNECTION_POOLS.clear()
+    AsyncRedisHandler.CLIENTS.clear()
+    yield
+    RedisHandler.CONNECTION_POOLS.clear()
+    AsyncRedisHandler.CONNECTION_POOLS.clear()
+    AsyncRedisHandler.CLIENTS.clear()
+
+
+class InMemoryRedis:
+    """Stand-in of the redis clients used by RedisHandler, keeping the values as bytes like a non decoding client returns them."""
+
+    def __init__(self):
+        self.store = dict()
+
+    @staticmethod
+    def encode(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value):
+        self.store[key] = self.encode(value)
+
+    def mset(self, mapping):
+        for key, value in mapping.items():
+            self.set(key, value)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+    def hset(self, key, mapping):
+        self.store[key] = {field.encode(): self.encode(value) for field, value in mapping.items()}
+
+    def hgetall(self, key):
+        return self.store.get(key, dict())
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+def make_handler(cache_dfs_as_arrow_ipc: bool = False) -> RedisHandler:
+    """Create RedisHandler instance whose clients read and write the same in-memory store."""
+    with patch('redis_handler.redis.ConnectionPool'), patch('redis_handler.redis.Redis'):
+        handler = RedisHandler(Mock(), "localhost", 6379, "secret", cache_dfs_as_arrow_ipc=cache_dfs_as_arrow_ipc)
+
+    handler.client = handler.bytes_client = InMemoryRedis()
+
+    return handler
+
+
+# Dataframe cached by the SND ETLs tests
+SAMPLE_DF = pd.DataFrame({"asset_code": ["AMBP16", "AMBP26"], "unit_price": [1012.5, 998.25]})
+
+
+class TestGetPool:
+    """Tests for the connection pools shared by the handlers."""
+
+    def test_same_server_settings_share_the_pool(self):
+        """Test that handlers of the same server, credentials and database reuse the pool."""
+        with patch('redis_handler.redis.ConnectionPool') as mock_pool_class:
+            first_pool = RedisHandler.get_pool("localhost", 6379, "secret", decode_responses=True)
+            second_pool = RedisHandler.get_pool("localhost", 6379, "secret", decode_responses=True)
+
+        assert first_pool is second_pool
+        mock_pool_class.assert_called_once()
+
+    @pytest.mark.parametrize("password, db, decode_responses", [
+        ("other-secret", 0, True),
+        ("secret", 1, True),
+        ("secret", 0, False),
+    ])
+    def test_other_credentials_or_db_get_another_pool(self, password, db, decode_responses):
+        """Test that another password, database or decoding setting doesn't reuse the pool."""
+        with patch('redis_handler.redis.ConnectionPool', side_effect=lambda **kwargs: Mock(**kwargs)):
+            first_pool = RedisHandler.get_pool("localhost", 6379, "secret", decode_responses=True)
+            second_pool = RedisHandler.get_pool("localhost", 6379, password, decode_responses=decode_responses, db=db)
+
+        assert first_pool is not second_pool
+        assert second_pool.db == db
+
+    def test_password_is_not_kept_in_the_pool_key(self):
+        """Test that the pools registry doesn't hold the password in plain text."""
+        with patch('redis_handler.redis.ConnectionPool'):
+            RedisHandler.get_pool("localhost", 6379, "secret", decode_responses=True)
+
+        assert all("secret" not in pool_key for pool_key in RedisHandler.CONNECTION_POOLS)
+
+
+class TestBuildCachePayload:
+    """Tests for the JSON payloads shared by both handlers."""
+
+    def test_small_payload_is_plain_json(self):
+        """Test that payloads up to COMPRESSION_MIN_PAYLOAD_SIZE are stored as plain JSON, with the required fields."""
+        payload = build_cache_payload(fmts.GoldServingTableNames.DEB_TERMS, [{"series": "1"}], datetime(2025, 10, 19), "test-trace-123")
+
+        saved = orjson.loads(payload)
+        assert saved["data"] == [{"series": "1"}]
+        assert saved["data_orient"] == "records"
+        assert saved["trace_id"] == "test-trace-123"
+
+    def test_big_payload_is_zstd_compressed(self):
+        """Test that payloads over COMPRESSION_MIN_PAYLOAD_SIZE are zstd compressed."""
+        data = [{"text": "x" * 1024} for _ in range(COMPRESSION_MIN_PAYLOAD_SIZE // 1024)]
+
+        payload = build_cache_payload(fmts.GoldServingTableNames.DEB_TERMS, data, datetime(2025, 10, 19), "test-trace-123")
+
+        assert orjson.loads(zstandard.decompress(payload))["data"] == data
+
+
+class TestAsyncRedisHandler:
+    """Tests for AsyncRedisHandler."""
+
+    def test_pools_are_shared_within_an_event_loop(self):
+        """Test that the handlers of the same server reuse the pool of the running event loop."""
+        async def get_pools():
+            return AsyncRedisHandler.get_pool("localhost", 6379, "secret"), AsyncRedisHandler.get_pool("localhost", 6379, "secret")
+
+        with patch('redis_handler.redis.asyncio.ConnectionPool', side_effect=lambda **kwargs: Mock(**kwargs)):
+            first_pool, second_pool = asyncio.run(get_pools())
+
+        assert first_pool is second_pool
+
+    def test_each_event_loop_gets_its_own_pool(self):
+        """Test that a pool opened in an event loop isn't reused by another one."""
+        async def get_pool():
+            return AsyncRedisHandler.get_pool("localhost", 6379, "secret")
+
+        with patch('redis_handler.redis.asyncio.ConnectionPool', side_effect=lambda **kwargs: Mock(**kwargs)):
+            first_pool = asyncio.run(get_pool())
+            second_pool = asyncio.run(get_pool())
+
+        assert first_pool is not second_pool
+
+    def test_client_is_reused_within_an_event_loop(self):
+        """Test that the handler creates a single client per event loop, instead of one per call."""
+        handler = AsyncRedisHandler(Mock(), "localhost", 6379, "secret")
+
+        async def get_clients():
+            return handler.get_client(), handler.get_client()
+
+        with patch('redis_handler.redis.asyncio.ConnectionPool'), \
+             patch('redis_handler.redis.asyncio.Redis', side_effect=lambda **kwargs: Mock(**kwargs)) as mock_redis_class:
+            first_client, second_client = asyncio.run(get_clients())
+            other_loop_client, _ = asyncio.run(get_clients())
+
+        assert first_client is second_client
+        assert other_loop_client is not first_client
+        assert mock_redis_class.call_count == 2
+
+    def test_save_many_to_cache_uses_a_single_mset(self):
+        """Test that several tables are saved with one MSET, holding the same payloads RedisHandler writes."""
+        handler = AsyncRedisHandler(Mock(), "localhost", 6379, "secret")
+        entries = [(fmts.GoldServingTableNames.DEB_TERMS, [{"series": "1"}], datetime(2025, 10, 19), "test-trace-123"),
+                   (fmts.GoldServingTableNames.DEB_EVENTS_SCHEDULE, [{"event": "Juros"}], datetime(2025, 10, 19), "test-trace-123")]
+
+        with patch('redis_handler.redis.asyncio.ConnectionPool'), \
+             patch('redis_handler.redis.asyncio.Redis') as mock_redis_class:
+            mock_pipe = mock_redis_class.return_value.pipeline.return_value.__aenter__.return_value
+            mock_pipe.execute = AsyncMock()
+            asyncio.run(handler.save_many_to_cache(entries))
+
+        mock_pipe.mset.assert_called_once_with({entry[0].value: build_cache_payload(*entry) for entry in entries})
+        mock_pipe.delete.assert_called_once_with(*[f"{entry[0].value}{RedisHandler.BYTES_CACHE_KEY_SUFFIX}" for entry in entries])
+        mock_pipe.execute.assert_awaited_once()
+
+
+class TestRedisHandlerCache:
+    """Tests for the RedisHandler cache round trips."""
+
+    def test_save_df_to_cache_writes_json_by_default(self):
+        """Test that dataframes are cached as the JSON payload read by get_from_cache consumers."""
+        handler = make_handler()
+
+        handler.save_df_to_cache(fmts.GoldServingTableNames.DEB_TERMS, SAMPLE_DF, datetime(2025, 10, 19), "test-trace-123")
+
+        saved = orjson.loads(handler.get_from_cache(fmts.GoldServingTableNames.DEB_TERMS))
+        assert saved["data"] == {"asset_code": ["AMBP16", "AMBP26"], "unit_price": [1012.5, 998.25]}
+        assert saved["data_orient"] == "list"
+        pd.testing.assert_frame_equal(handler.get_df_from_cache(fmts.GoldServingTableNames.DEB_TERMS), SAMPLE_DF)
+
+    def test_save_df_to_cache_as_arrow_ipc(self):
+        """Test that handlers opting in cache dataframes as Arrow IPC streams, read back by get_df_from_cache."""
+        handler = make_handler(cache_dfs_as_arrow_ipc=True)
+
+        handler.save_df_to_cache(fmts.GoldServingTableNames.DEB_TERMS, SAMPLE_DF, datetime(2025, 10, 19), "test-trace-123")
+
+        assert handler.get_bytes_from_cache(fmts.GoldServingTableNames.DEB_TERMS)["data_format"] == RedisHandler.ARROW_IPC_DATA_FORMAT
+        assert handler.get_from_cache(fmts.GoldServingTableNames.DEB_TERMS) is None
+        pd.testing.assert_frame_equal(handler.get_df_from_cache(fmts.GoldServingTableNames.DEB_TERMS), SAMPLE_DF)
+
+    def test_switching_formats_removes_the_stale_entry(self):
+        """Test that saving a table in one format removes its entry in the other one."""
+        arrow_handler = make_handler(cache_dfs_as_arrow_ipc=True)
+        arrow_handler.save_df_to_cache(fmts.GoldServingTableNames.DEB_TERMS, SAMPLE_DF, datetime(2025, 10, 19), "test-trace-123")
+
+        json_handler = make_handler()
+        json_handler.client = json_handler.bytes_client = arrow_handler.client
+        json_handler.save_df_to_cache(fmts.GoldServingTableNames.DEB_TERMS, SAMPLE_DF.head(1), datetime(2025, 10, 20), "test-trace-456")
+
+        assert json_handler.get_bytes_from_cache(fmts.GoldServingTableNames.DEB_TERMS) == {}
+        pd.testing.assert_frame_equal(json_handler.get_df_from_cache(fmts.GoldServingTableNames.DEB_TERMS), SAMPLE_DF.head(1))
+
+    def test_get_from_cache_decompresses_zstd_payloads(self):
+        """Test that compressed payloads are told apart from plain ones by the zstd frame magic number."""
+        handler = make_handler()
+        data = [{"text": "x" * 1024} for _ in range(COMPRESSION_MIN_PAYLOAD_SIZE // 1024)]
+
+        handler.save_to_cache(fmts.GoldServingTableNames.DEB_TERMS, data, datetime(2025, 10, 19), "test-trace-123")
+
+        assert handler.client.store[fmts.GoldServingTableNames.DEB_TERMS.value].startswith(ZSTD_FRAME_MAGIC)
+        assert orjson.loads(handler.get_from_cache(fmts.GoldServingTableNames.DEB_TERMS))["data"] == data
+
+    def test_get_from_cache_of_missing_table(self):
+        """Test that tables not cached return None."""
+        handler = make_handler()
+
+        assert handler.get_from_cache(fmts.GoldServingTableNames.DEB_TERMS) is None
+        assert handler.get_df_from_cache(fmts.GoldServingTableNames.DEB_TERMS) is None
+
+    def test_save_many_to_cache_uses_a_single_mset(self):
+        """Test that several tables are saved with one MSET round trip."""
+        handler = make_handler()
+        handler.client = MagicMock()
+        mock_pipe = handler.client.pipeline.return_value.__enter__.return_value
+        entries = [(fmts.GoldServingTableNames.DEB_TERMS, [{"series": "1"}], datetime(2025, 10, 19), "test-trace-123"),
+                   (fmts.GoldServingTableNames.DEB_EVENTS_SCHEDULE, [{"event": "Juros"}], datetime(2025, 10, 19), "test-trace-123")]
+
+        handler.save_many_to_cache(entries)
+
+        mock_pipe.mset.assert_called_once_with({entry[0].value: build_cache_payload(*entry) for entry in entries})
+        mock_pipe.execute.assert_called_once()
+
+    def test_save_to_cache_removes_the_stale_bytes_entry(self):
+        """Test that re-saving a table cached as Arrow IPC through save_to_cache serves the new JSON data."""
+        handler = make_handler(cache_dfs_as_arrow_ipc=True)
+        handler.save_df_to_cache(fmts.GoldServingTableNames.DEB_TERMS, SAMPLE_DF, datetime(2025, 10, 19), "test-trace-123")
+
+        handler.save_to_cache(fmts.GoldServingTableNames.DEB_TERMS, SAMPLE_DF.head(1).to_dict(orient="records"), datetime(2025, 10, 20), "test-trace-456")
+
+        assert handler.get_bytes_from_cache(fmts.GoldServingTableNames.DEB_TERMS) == {}
+        pd.testing.assert_frame_equal(handler.get_df_from_cache(fmts.GoldServingTableNames.DEB_TERMS), SAMPLE_DF.head(1))
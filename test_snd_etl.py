@@ -0,0 +1,105 @@
+import pytest
+import pandas as pd
+import pyarrow as pa
+from unittest.mock import Mock, patch
+from concurrent.futures import ThreadPoolExecutor
+
+from etls.snd_etl import SNDETL, concat_tables_with_unified_schema
+import formats as fmts
+
+
+class TestConcatTablesWithUnifiedSchema:
+    """Tests for the debenture terms tables concatenation."""
+
+    def test_all_nan_double_and_string_columns(self):
+        """Test that a column parsed as all-NaN double in one debenture and as string in another is concatenated as string."""
+        first_table = pa.Table.from_pandas(pd.DataFrame({"series": ["1"], "enr_agent": [float("nan")]}), preserve_index=False)
+        second_table = pa.Table.from_pandas(pd.DataFrame({"series": ["2"], "enr_agent": ["Agent S.A."]}), preserve_index=False)
+
+        result = concat_tables_with_unified_schema([first_table, second_table])
+
+        assert result.schema.field("enr_agent").type == pa.string()
+        assert result.column("enr_agent").to_pylist() == [None, "Agent S.A."]
+
+    def test_int_and_double_columns_are_promoted_to_double(self):
+        """Test that int64 and double variants of a column are concatenated as double."""
+        first_table = pa.Table.from_pandas(pd.DataFrame({"quantity": [10]}), preserve_index=False)
+        second_table = pa.Table.from_pandas(pd.DataFrame({"quantity": [2.5]}), preserve_index=False)
+
+        result = concat_tables_with_unified_schema([first_table, second_table])
+
+        assert result.schema.field("quantity").type == pa.float64()
+        assert result.column("quantity").to_pylist() == [10.0, 2.5]
+
+    def test_int_and_string_columns_fall_back_to_string(self):
+        """Test that variants of a column without a common type are concatenated as string."""
+        first_table = pa.Table.from_pandas(pd.DataFrame({"rating": [1]}), preserve_index=False)
+        second_table = pa.Table.from_pandas(pd.DataFrame({"rating": ["AA"]}), preserve_index=False)
+
+        result = concat_tables_with_unified_schema([first_table, second_table])
+
+        assert result.schema.field("rating").type == pa.string()
+        assert result.column("rating").to_pylist() == ["1", "AA"]
+
+    def test_missing_columns_are_filled_with_nulls(self):
+        """Test that columns found only in some debentures are kept, with nulls for the others, in the first seen order."""
+        first_table = pa.Table.from_pandas(pd.DataFrame({"series": ["1"]}), preserve_index=False)
+        second_table = pa.Table.from_pandas(pd.DataFrame({"series": ["2"], "enr_extra": [3.0]}), preserve_index=False)
+
+        result = concat_tables_with_unified_schema([first_table, second_table])
+
+        assert result.column_names == ["series", "enr_extra"]
+        assert result.column("enr_extra").to_pylist() == [None, 3.0]
+
+
+@pytest.fixture
+def snd_etl():
+    """Create SNDETL instance with mocked dependencies, whose HTTP sessions return a sample TSV."""
+    config = Mock(spec=fmts.IngestionOrchestratorConfig)
+    config.logger = Mock()
+    config.minio_handler = Mock()
+    config.redis_handler = Mock()
+    config.trace_id = "test-trace-123"
+
+    session = Mock()
+    session.get.return_value.content = b"Serie Emissao\tData de Emissao\n1\t01/01/2020\n"
+
+    with patch('network.create_http_session', return_value=session):
+        etl = SNDETL(config)
+
+    etl.deb_terms_url = f"https://www.debentures.com.br/mock/terms/{fmts.PLACEHOLDER_VALUE}"
+
+    return etl
+
+
+class TestBronzeUploads:
+    """Tests for the bronze layer uploads run in the background pool."""
+
+    def test_upload_failure_is_raised_when_the_parse_fails(self, snd_etl):
+        """Test that the background upload exception is surfaced even when the TSV parse fails first."""
+        snd_etl.config.minio_handler.save_file_to_bucket.side_effect = Exception("Upload failed")
+
+        with ThreadPoolExecutor(max_workers=SNDETL.BRONZE_UPLOAD_WORKERS) as upload_pool, \
+             patch('etls.snd_etl.pd.read_csv', side_effect=ValueError("Parse failed")):
+            with pytest.raises(Exception, match="Upload failed"):
+                snd_etl.get_treated_debenture_terms("AMBP16", upload_pool)
+
+        snd_etl.config.minio_handler.save_file_to_bucket.assert_called_once()
+
+    def test_full_etl_shuts_its_upload_pool_down(self, snd_etl):
+        """Test that the upload pool created by a full ETL is shut down once the ETL finishes."""
+        upload_pools = list()
+
+        def get_treated_debenture_terms(debenture_code, upload_pool):
+            upload_pools.append(upload_pool)
+            return pd.DataFrame({"series": ["1"]})
+
+        snd_etl.config.save_df_to_gold_export_and_serving.return_value = {fmts.MedallionLayer.GOLD_EXPORT: "gold/export/deb_terms.parquet"}
+
+        with patch.object(snd_etl, 'list_debentures_from_company', return_value=pd.DataFrame({SNDETL.DEB_ASSED_CODE_COLUM_NAME: ["AMBP16", "AMBP26"]})), \
+             patch.object(snd_etl, 'get_treated_debenture_terms', side_effect=get_treated_debenture_terms):
+            assert snd_etl.deb_terms_full_etl() == ["gold/export/deb_terms.parquet"]
+
+        assert len(upload_pools) == 2 and upload_pools[0] is upload_pools[1]
+        with pytest.raises(RuntimeError):
+            upload_pools[0].submit(print)